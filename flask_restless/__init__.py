@@ -19,4 +19,6 @@
 __version__ = '0.9.0-dev'
 
 # make the following name available as part of the public API
+from .cache import LRUCache
 from .manager import APIManager
+from .search import register_operator
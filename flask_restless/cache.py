@@ -0,0 +1,220 @@
+"""
+    flask.ext.restless.cache
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Provides caching of the responses to :http:method:`get` requests made on
+    the APIs created by :class:`flask.ext.restless.manager.APIManager`.
+
+    :class:`flask.ext.restless.cache.LRUCache`
+      A backend which stores a bounded number of values in the memory of the
+      current process.
+
+    :class:`flask.ext.restless.cache.ResponseCache`
+      Stores responses in a backend, keyed by the request, and invalidates the
+      stored responses involving a model when instances of that model change.
+
+    :copyright: 2012 Jeffrey Finkelstein <jeffrey.finkelstein@gmail.com>
+    :license: GNU AGPLv3+ or BSD
+
+"""
+from __future__ import with_statement
+
+import hashlib
+from itertools import count
+from threading import Lock
+import time
+import uuid
+
+from sqlalchemy.orm import class_mapper
+
+
+def _table_names(models):
+    """Returns the sorted list of the names of the tables to which `models`
+    are mapped.
+
+    A model mapped to several tables (for example, by joined table
+    inheritance) contributes the names of all of them, and the name of a
+    table shared by several models (for example, by single table inheritance)
+    appears once.
+
+    """
+    names = set()
+    for model in models:
+        names.update(table.fullname for table in class_mapper(model).tables)
+    return sorted(names)
+
+
+class LRUCache(object):
+    """A cache backend which stores values in the memory of the current
+    process.
+
+    At most `max_entries` values are stored; when more are stored, the least
+    recently used values are discarded (a quarter of them at a time, so the
+    cost of finding them is spread over many calls to :meth:`set`). Each value
+    also expires after a timeout.
+
+    The interface of this class (the :meth:`get`, :meth:`set`, and
+    :meth:`delete` methods) is the same as the interface of the caches in
+    :mod:`werkzeug.contrib.cache`, so any of those caches (for example,
+    :class:`werkzeug.contrib.cache.RedisCache`, which can be shared by several
+    processes) can be used as a backend instead.
+
+    """
+
+    def __init__(self, max_entries=1000, default_timeout=300):
+        """Creates an empty cache.
+
+        `max_entries` is the maximum number of values stored in the cache.
+
+        `default_timeout` is the number of seconds after which a value expires
+        if no timeout is given when setting the value.
+
+        """
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        # maps each key to a list containing the time at which its value
+        # expires, the value, and the number of the last use of the value
+        self._entries = {}
+        self._uses = count()
+        self._lock = Lock()
+
+    def get(self, key):
+        """Returns the value stored for `key`, or ``None`` if there is no such
+        value or it has expired.
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value, last_use = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                return None
+            entry[2] = self._uses.next()
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Stores `value` for `key`, for `timeout` seconds.
+
+        If `timeout` is ``None``, the default timeout specified in the
+        constructor is used instead. If the timeout is zero, the value never
+        expires (although it may be discarded to make room for other values).
+
+        """
+        if timeout is None:
+            timeout = self.default_timeout
+        expires = time.time() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = [expires, value, self._uses.next()]
+            if len(self._entries) > self.max_entries:
+                entries = sorted(self._entries.iteritems(),
+                                 key=lambda item: item[1][2])
+                num_discarded = len(entries) - self.max_entries * 3 // 4
+                for oldkey, entry in entries[:num_discarded]:
+                    del self._entries[oldkey]
+        return True
+
+    def delete(self, key):
+        """Removes the value stored for `key`, if any."""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        """Removes all values from the cache."""
+        with self._lock:
+            self._entries.clear()
+        return True
+
+
+class ResponseCache(object):
+    """Stores the data of responses in a cache backend, along with the state
+    of the models on which they depend.
+
+    Each table has a *generation*, a random token stored in the backend which
+    is replaced by a new one whenever :meth:`invalidate` is called for a model
+    mapped to that table. The key under which a response is stored includes
+    the generations of the tables of all the models on which the response
+    depends, so invalidating a model makes all the stored responses which
+    depend on it (or on another model which shares one of its tables)
+    unreachable, without having to find and remove them; they are eventually
+    discarded by the backend.
+
+    Since the generations are stored in the backend, a backend which is shared
+    by several processes also shares the invalidations.
+
+    """
+
+    #: The format of the key under which the generation of a table is stored.
+    GENERATION_KEY_FORMAT = 'flask_restless:generation:%s'
+
+    #: The format of the key under which a response is stored.
+    RESPONSE_KEY_FORMAT = 'flask_restless:response:%s'
+
+    #: The number of seconds for which a generation is stored. A generation
+    #: which expires is simply replaced by a new one, which invalidates the
+    #: responses depending on it.
+    GENERATION_TIMEOUT = 24 * 60 * 60
+
+    def __init__(self, backend, timeout=None):
+        """Creates a cache which stores responses in `backend`.
+
+        `backend` is an object with ``get(key)`` and ``set(key, value,
+        timeout)`` methods, like :class:`LRUCache`.
+
+        `timeout` is the number of seconds for which a response is stored. If
+        it is ``None``, the default timeout of the backend is used.
+
+        """
+        self.backend = backend
+        self.timeout = timeout
+
+    def _generation(self, table_name):
+        """Returns the current generation of the table with the specified
+        name, creating one if there is none (for example, if it has expired).
+
+        """
+        key = self.GENERATION_KEY_FORMAT % table_name
+        generation = self.backend.get(key)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            self.backend.set(key, generation, self.GENERATION_TIMEOUT)
+        return generation
+
+    def invalidate(self, models):
+        """Makes all stored responses which depend on any of `models`
+        unreachable.
+
+        """
+        for table_name in _table_names(models):
+            key = self.GENERATION_KEY_FORMAT % table_name
+            self.backend.set(key, uuid.uuid4().hex, self.GENERATION_TIMEOUT)
+
+    def key(self, request_key, models):
+        """Returns the key under which the response to a request is stored.
+
+        `request_key` is a hashable object which identifies the request, and
+        `models` is the list of models on which the response to the request
+        depends.
+
+        """
+        generations = [self._generation(table_name)
+                       for table_name in _table_names(models)]
+        digest = hashlib.md5(repr((request_key, generations))).hexdigest()
+        return self.RESPONSE_KEY_FORMAT % digest
+
+    def get(self, key):
+        """Returns the value stored with :meth:`set` for `key`, or ``None`` if
+        there is no such value.
+
+        """
+        return self.backend.get(key)
+
+    def set(self, key, value):
+        """Stores `value` for `key`, where `key` was returned by :meth:`key`.
+
+        `value` must be picklable if the backend stores values outside of the
+        current process.
+
+        """
+        self.backend.set(key, value, self.timeout)
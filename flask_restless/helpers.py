@@ -8,6 +8,16 @@
     :license: GNU AGPLv3+ or BSD
 
 """
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import Date
+from sqlalchemy import DateTime
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.orm import RelationshipProperty
+
+#: The :class:`FieldIndex` of each model for which one has been requested, as
+#: returned by :func:`field_index`.
+_FIELD_INDEXES = WeakKeyDictionary()
 
 
 def partition(l, condition):
@@ -43,3 +53,88 @@ def unicode_keys_to_strings(dictionary):
 
     """
     return dict((str(k), v) for k, v in dictionary.iteritems())
+
+
+class FieldIndex(object):
+    """The fields of a SQLAlchemy model, along with the information about each
+    field needed to handle requests, computed once instead of on each request.
+
+    The fields are the attributes managed by SQLAlchemy (that is, columns and
+    relationships). Use :func:`field_index` to get the (shared) index of a
+    model instead of creating instances of this class directly.
+
+    """
+
+    def __init__(self, model):
+        #: The model whose fields are indexed.
+        self.model = model
+        #: The mapping from name to class attribute of each field.
+        self.attributes = {}
+        #: The mapping from name to type of each field which is a column.
+        self.columns = {}
+        #: The set of names of the fields which are dates or datetimes.
+        self.date_fields = set()
+        #: The list of names of the fields which are relationships.
+        self.relations = []
+        #: The mapping from name to related model of each relationship.
+        self.related_models = {}
+        #: The mapping from name to ``True`` for each relationship to a list
+        #: of instances, or to ``False`` for a relationship to a single
+        #: instance.
+        self.uselist = {}
+        # ensure that the relationships defined on other models (for example,
+        # by backrefs) have been added to this model
+        class_mapper(model)
+        manager = model._sa_class_manager
+        for name in manager:
+            attribute = manager[name]
+            self.attributes[name] = attribute
+            prop = attribute.property
+            if isinstance(prop, RelationshipProperty):
+                self.relations.append(name)
+                self.related_models[name] = prop.mapper.class_
+                self.uselist[name] = prop.uselist
+            elif getattr(prop, 'columns', None):
+                fieldtype = prop.columns[0].type
+                self.columns[name] = fieldtype
+                if isinstance(fieldtype, (Date, DateTime)):
+                    self.date_fields.add(name)
+
+    def __contains__(self, name):
+        """Returns ``True`` if and only if the model has an attribute named
+        `name`, whether or not it is managed by SQLAlchemy.
+
+        """
+        return name in self.attributes or hasattr(self.model, name)
+
+    def attribute(self, name):
+        """Returns the class attribute of the model named `name`, to be used
+        in a SQLAlchemy expression.
+
+        Attributes which are not managed by SQLAlchemy (for example, hybrid
+        properties) are looked up on the model itself.
+
+        Raises :exc:`AttributeError` if the model has no attribute named
+        `name`.
+
+        """
+        try:
+            return self.attributes[name]
+        except KeyError:
+            try:
+                return getattr(self.model, name)
+            except AttributeError:
+                msg = "Model %s has no field '%s'" % (self.model.__name__,
+                                                      name)
+                raise AttributeError(msg)
+
+
+def field_index(model):
+    """Returns the :class:`FieldIndex` of `model`, creating it if this is the
+    first time it has been requested.
+
+    """
+    index = _FIELD_INDEXES.get(model)
+    if index is None:
+        index = _FIELD_INDEXES[model] = FieldIndex(model)
+    return index
@@ -15,12 +15,20 @@
 from flask import Blueprint
 from sqlalchemy.orm import scoped_session
 
+from .cache import ResponseCache
+from .helpers import field_index
+from .views import _json_dumps_function
 from .views import API
+from .views import BatchAPI
 from .views import FunctionAPI
 
 #: The set of methods which are allowed by default when creating an API
 READONLY_METHODS = frozenset(('GET', ))
 
+#: The set of methods by which the total number of results of a search can be
+#: computed when paginating the results.
+COUNT_MODES = frozenset(('exact', 'estimated', 'skipped'))
+
 
 class IllegalArgumentError(Exception):
     """This exception is raised when a calling function has provided illegal
@@ -57,7 +65,9 @@ class APIManager(object):
     #:    has been registered.
     BLUEPRINTNAME_FORMAT = '%s%s'
 
-    def __init__(self, app=None, session=None, flask_sqlalchemy_db=None):
+    def __init__(self, app=None, session=None, flask_sqlalchemy_db=None,
+                 json_encoder=None, compact_json=False, cache=None,
+                 cache_timeout=None):
         """Stores the specified :class:`flask.Flask` application object on
         which API endpoints will be registered.
 
@@ -79,6 +89,26 @@ class APIManager(object):
 
         If `flask_sqlalchemy_db` is not ``None``, `session` will be ignored.
 
+        `json_encoder` specifies how the data in all responses is serialized
+        to JSON. It may be the name of a JSON library (either ``'json'`` or
+        ``'simplejson'``) or a function which accepts a single object and
+        returns its JSON representation as a string. If it is ``None``, the
+        :mod:`flask.json` module is used. For more information, see
+        :ref:`jsonencoder`.
+
+        If `compact_json` is ``True``, JSON responses from all APIs created by
+        this object contain no insignificant whitespace, unless the
+        `compact_json` keyword argument to :meth:`create_api_blueprint`
+        specifies otherwise. For more information, see :ref:`compactjson`.
+
+        `cache` is a cache backend in which responses to :http:method:`get`
+        requests on all APIs created by this object are stored, such as a
+        :class:`~flask.ext.restless.cache.LRUCache` or one of the caches in
+        :mod:`werkzeug.contrib.cache`. If it is ``None``, responses are not
+        cached. `cache_timeout` is the number of seconds for which a response
+        is stored; if it is ``None``, the default timeout of the backend is
+        used. For more information, see :ref:`caching`.
+
         For example, to use this class with models defined in pure SQLAlchemy::
 
             from flask import Flask
@@ -102,8 +132,13 @@ class APIManager(object):
             db = SQLALchemy(app)
             apimanager = APIManager(app, flask_sqlalchemy_db=db)
 
+        .. versionadded:: 0.9
+           Added the `json_encoder`, `compact_json`, `cache`, and
+           `cache_timeout` keyword arguments.
+
         """
-        self.init_app(app, session, flask_sqlalchemy_db)
+        self.init_app(app, session, flask_sqlalchemy_db, json_encoder,
+                      compact_json, cache, cache_timeout)
 
     def _next_blueprint_name(self, basename):
         """Returns the next name for a blueprint with the specified base name.
@@ -132,7 +167,9 @@ class APIManager(object):
             next_number = max(existing_numbers) + 1
         return APIManager.BLUEPRINTNAME_FORMAT % (basename, next_number)
 
-    def init_app(self, app, session=None, flask_sqlalchemy_db=None):
+    def init_app(self, app, session=None, flask_sqlalchemy_db=None,
+                 json_encoder=None, compact_json=False, cache=None,
+                 cache_timeout=None):
         """Stores the specified :class:`flask.Flask` application object on
         which API endpoints will be registered and the
         :class:`sqlalchemy.orm.session.Session` object in which all database
@@ -147,6 +184,11 @@ class APIManager(object):
 
         If `flask_sqlalchemy_db` is not ``None``, `session` will be ignored.
 
+        `json_encoder`, `compact_json`, `cache`, and `cache_timeout` are as
+        described in the constructor of this class. If `json_encoder` names a
+        JSON library which is not installed, or is neither a string nor a
+        function, this method raises :exc:`IllegalArgumentError`.
+
         This is for use in the situation in which this class must be
         instantiated before the :class:`~flask.Flask` application has been
         created.
@@ -182,11 +224,25 @@ class APIManager(object):
             db = SQLALchemy(app)
             apimanager.init_app(app, flask_sqlalchemy_db=db)
 
+        .. versionadded:: 0.9
+           Added the `json_encoder`, `compact_json`, `cache`, and
+           `cache_timeout` keyword arguments.
+
         """
         self.app = app
         self.session = session or getattr(flask_sqlalchemy_db, 'session', None)
         if isinstance(self.session, type):
             self.session = scoped_session(self.session)
+        try:
+            _json_dumps_function(json_encoder)
+        except (ImportError, ValueError), exception:
+            raise IllegalArgumentError(str(exception))
+        self.json_encoder = json_encoder
+        self.compact_json = compact_json
+        if cache is not None:
+            self.cache = ResponseCache(cache, cache_timeout)
+        else:
+            self.cache = None
 
     def create_api_blueprint(self, model, methods=READONLY_METHODS,
                              url_prefix='/api', collection_name=None,
@@ -195,7 +251,13 @@ class APIManager(object):
                              authentication_function=None,
                              exclude_columns=None, include_columns=None,
                              validation_exceptions=None, results_per_page=10,
-                             post_form_preprocessor=None, custom_save_method=None):
+                             post_form_preprocessor=None,
+                             custom_save_method=None, keyset_pagination=False,
+                             count_mode='exact',
+                             stream_results=False, compact_json=None,
+                             omit_nulls=False, version_column=None,
+                             last_modified_column=None,
+                             allow_delete_many=False):
         """Creates an returns a ReSTful API interface as a blueprint, but does
         not register it on any :class:`flask.Flask` application.
 
@@ -250,6 +312,12 @@ class APIManager(object):
         information on the search query parameter ``q``, see
         :ref:`searchformat`.
 
+        If `allow_delete_many` is ``True``, then requests to
+        :http:delete:`/api/<collection_name>?q=<searchjson>` will delete each
+        of the instances of the model which match the specified search query,
+        which must have at least one filter. This is ``False`` by default. For
+        more information, see :ref:`deletemany`.
+
         `validation_exceptions` is the tuple of possible exceptions raised by
         validation of your database models. If this is specified, validation
         errors will be captured and forwarded to the client in JSON format. For
@@ -306,6 +374,51 @@ class APIManager(object):
         is not read from the post parameters (where malicious user can tamper
         with them) but from the session.
 
+        If `keyset_pagination` is ``True`` and pagination is enabled, responses
+        to :http:method:`get` requests on the collection will be paginated
+        using opaque cursors instead of page numbers, so that fetching a page
+        costs the same regardless of how deep into the result set it is. For
+        more information, see :ref:`keysetpagination`.
+
+        `count_mode` specifies how the total number of results is computed
+        for paginated responses to :http:method:`get` requests. It must be one
+        of ``'exact'`` (the default, which counts the matching rows),
+        ``'estimated'`` (which uses the estimate of the query planner, if the
+        database provides one) or ``'skipped'`` (which does not count the
+        results at all). If it is anything else, this function will raise
+        :exc:`IllegalArgumentError`. For more information, see
+        :ref:`countmode`.
+
+        If `stream_results` is ``True`` and pagination is disabled, responses
+        to :http:method:`get` requests on the collection are streamed to the
+        client as the instances are loaded from the database, instead of being
+        built in memory all at once. For more information, see
+        :ref:`streaming`.
+
+        If `compact_json` is ``True``, JSON responses from this API contain no
+        insignificant whitespace; if it is ``False``, they are indented. If it
+        is ``None``, the `compact_json` keyword argument to the constructor of
+        this class is used instead. If `omit_nulls` is ``True``, fields whose
+        value is ``None`` are not included in the JSON representations of
+        instances of `model`. For more information, see :ref:`compactjson`.
+
+        `version_column` is the name of a column of `model` whose value changes
+        whenever an instance is updated (for example, a version number), and
+        `last_modified_column` is the name of a column of `model` containing
+        the date and time at which an instance was last updated. If either is
+        specified, the ``ETag`` and ``Last-Modified`` headers of responses to
+        :http:method:`get` requests are computed from these columns, so
+        unchanged resources can be reported to clients making conditional
+        requests without loading them. If either names an attribute which does
+        not exist on `model`, this method raises
+        :exc:`IllegalArgumentError`. For more information, see
+        :ref:`conditional`.
+
+        .. versionadded:: 0.9
+           Added the `keyset_pagination`, `count_mode`, `stream_results`,
+           `compact_json`, `omit_nulls`, `version_column`,
+           `last_modified_column`, and `allow_delete_many` keyword arguments.
+
         .. versionadded:: 0.7
            Added the `exclude_columns` keyword argument.
 
@@ -337,17 +450,30 @@ class APIManager(object):
             msg = ('Cannot simultaneously specify both include columns and'
                    ' exclude columns.')
             raise IllegalArgumentError(msg)
+        if count_mode not in COUNT_MODES:
+            msg = ('count_mode must be one of %s'
+                   % ', '.join(sorted(COUNT_MODES)))
+            raise IllegalArgumentError(msg)
+        # resolve the fields of the model once, instead of on each request
+        fields = field_index(model)
+        for column in version_column, last_modified_column:
+            if column is not None and column not in fields:
+                msg = 'Model %s has no column "%s"' % (model.__name__, column)
+                raise IllegalArgumentError(msg)
         if collection_name is None:
             collection_name = model.__tablename__
+        if compact_json is None:
+            compact_json = self.compact_json
         # convert all method names to upper case
         methods = frozenset((m.upper() for m in methods))
         # sets of methods used for different types of endpoints
         no_instance_methods = methods & frozenset(('POST', ))
+        possibly_empty_methods = set(('GET', ))
         if allow_patch_many:
-            possibly_empty_instance_methods = \
-                methods & frozenset(('GET', 'PATCH', 'PUT'))
-        else:
-            possibly_empty_instance_methods = methods & frozenset(('GET', ))
+            possibly_empty_methods.update(('PATCH', 'PUT'))
+        if allow_delete_many:
+            possibly_empty_methods.add('DELETE')
+        possibly_empty_instance_methods = methods & possibly_empty_methods
         instance_methods = \
             methods & frozenset(('GET', 'PATCH', 'DELETE', 'PUT'))
         # the base URL of the endpoints on which requests will be made
@@ -359,7 +485,16 @@ class APIManager(object):
                                authentication_required_for,
                                authentication_function, exclude_columns,
                                include_columns, validation_exceptions,
-                               results_per_page, post_form_preprocessor)
+                               results_per_page, post_form_preprocessor,
+                               keyset_pagination=keyset_pagination,
+                               count_mode=count_mode,
+                               stream_results=stream_results,
+                               json_encoder=self.json_encoder,
+                               compact_json=compact_json,
+                               omit_nulls=omit_nulls,
+                               version_column=version_column,
+                               last_modified_column=last_modified_column,
+                               cache=self.cache)
         # suffix an integer to apiname according to already existing blueprints
         blueprintname = self._next_blueprint_name(apiname)
         # add the URL rules to the blueprint: the first is for methods on the
@@ -387,7 +522,9 @@ class APIManager(object):
         if allow_functions:
             eval_api_name = apiname + 'eval'
             eval_api_view = FunctionAPI.as_view(eval_api_name, self.session,
-                                                model)
+                                                model,
+                                                json_encoder=self.json_encoder,
+                                                compact_json=compact_json)
             eval_endpoint = '/eval' + collection_endpoint
             blueprint.add_url_rule(eval_endpoint, methods=['GET'],
                                    view_func=eval_api_view)
@@ -413,3 +550,52 @@ class APIManager(object):
         """
         blueprint = self.create_api_blueprint(*args, **kw)
         self.app.register_blueprint(blueprint)
+
+    def create_batch_api_blueprint(self, url_prefix='/api',
+                                   endpoint='/batch', max_requests=None):
+        """Creates and returns a blueprint containing an endpoint at
+        ``<url_prefix><endpoint>`` which accepts :http:method:`post` requests
+        containing a list of requests on other endpoints (for example, the
+        endpoints created by :meth:`create_api`), and responds with the list of
+        their responses, but does not register it on any :class:`flask.Flask`
+        application.
+
+        The requests in a batch are dispatched to the view functions of the
+        application directly, so a client can make many requests at the cost
+        of a single HTTP request. For a description of the request and
+        response formats, see :ref:`batch`.
+
+        `max_requests` is the maximum number of requests allowed in a single
+        batch. If it is ``None``, there is no maximum.
+
+        .. versionadded:: 0.9
+
+        """
+        if max_requests is not None and max_requests < 1:
+            msg = 'max_requests must be a positive integer'
+            raise IllegalArgumentError(msg)
+        apiname = APIManager.APINAME_FORMAT % 'batch'
+        batch_view = BatchAPI.as_view(apiname, self.session,
+                                      json_encoder=self.json_encoder,
+                                      max_requests=max_requests,
+                                      cache=self.cache)
+        blueprintname = self._next_blueprint_name(apiname)
+        blueprint = Blueprint(blueprintname, __name__, url_prefix=url_prefix)
+        blueprint.add_url_rule(endpoint, methods=['POST'],
+                               view_func=batch_view)
+        return blueprint
+
+    def create_batch_api(self, *args, **kw):
+        """Creates and registers a batch API blueprint on the
+        :class:`flask.Flask` application specified in the constructor of this
+        class.
+
+        The positional and keyword arguments are passed directly to the
+        :meth:`create_batch_api_blueprint` method, so see the documentation
+        there.
+
+        .. versionadded:: 0.9
+
+        """
+        blueprint = self.create_batch_api_blueprint(*args, **kw)
+        self.app.register_blueprint(blueprint)
@@ -15,19 +15,63 @@
 """
 import inspect
 
+from sqlalchemy import and_
+from sqlalchemy import or_
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.sql.visitors import cloned_traverse
+
+from .cache import LRUCache
+from .helpers import field_index
 from .helpers import unicode_keys_to_strings
 
-#: The mapping from operator name (as accepted by the search method) to a
-#: function which returns the SQLAlchemy expression corresponding to that
-#: operator.
-#:
-#: Each of these functions accepts either one, two, or three arguments. The
-#: first argument is the field object on which to apply the operator. The
-#: second argument, where it exists, is the second argument to the operator.
-#: The third argument, where it exists, is the name of the field.
+
+class Operator(object):
+    """Represents an operator which can be used in the filters of a search.
+
+    `function` is a function which returns the SQLAlchemy expression
+    corresponding to the operator. It accepts either one, two, or three
+    arguments. The first argument is the field object on which to apply the
+    operator. The second argument, where it exists, is the second argument to
+    the operator. The third argument, where it exists, is the name of the
+    field.
+
+    `numargs` is the number of arguments accepted by `function`. If it is
+    ``None``, it is computed from the signature of `function` (once, when this
+    object is created, instead of each time the operator is used).
+
+    Instances of this class are callable, and calling one is the same as
+    calling its :attr:`function`.
+
+    """
+
+    def __init__(self, function, numargs=None):
+        if numargs is None:
+            # in Python 2.6 or later, this should be `argspec.args`
+            numargs = len(inspect.getargspec(function)[0])
+        if numargs not in (1, 2, 3):
+            msg = 'an operator must accept one, two, or three arguments'
+            raise ValueError(msg)
+        #: The function which returns the SQLAlchemy expression corresponding
+        #: to this operator.
+        self.function = function
+        #: The number of arguments accepted by :attr:`function`.
+        self.numargs = numargs
+
+    def __call__(self, *args):
+        return self.function(*args)
+
+    def __repr__(self):
+        return '<Operator %s numargs=%s>' % (self.function, self.numargs)
+
+
+#: The mapping from operator name (as accepted by the search method) to an
+#: :class:`Operator` object, which creates the SQLAlchemy expression
+#: corresponding to that operator.
 #:
 #: Some operations have multiple names. For example, the equality operation can
 #: be described by the strings ``'=='``, ``'eq'``, ``'equals'``, etc.
+#:
+#: Use :func:`register_operator` to add operators to this mapping.
 OPERATORS = {
     # Operators which accept a single argument.
     'is_null': lambda f: f == None,
@@ -65,6 +109,50 @@ OPERATORS = {
     'has': lambda f, a, fn: f.has(**{str(fn): a}),
     'any': lambda f, a, fn: f.any(**{str(fn): a})
 }
+for name, function in OPERATORS.items():
+    OPERATORS[name] = Operator(function)
+del name, function
+
+#: The types of the values which may appear as the arguments of filters whose
+#: SQLAlchemy expressions are cached by
+#: :func:`QueryBuilder._create_parameterized_filters`.
+_BINDABLE_TYPES = (basestring, int, long, float, bool)
+
+#: The names of the database dialects which, when sorting in ascending order,
+#: put ``NULL`` values before all other values. The other databases (for
+#: example, PostgreSQL and Oracle) put them after all other values.
+_NULLS_FIRST_DIALECTS = frozenset(('sqlite', 'mysql', 'mssql', 'sybase'))
+
+#: The SQLAlchemy expressions for the filters of recent searches, keyed by the
+#: model, the shape of the filters, and the operators in :data:`OPERATORS` used
+#: by those filters. Since the number of distinct shapes is controlled by
+#: clients, the number of cached expressions is bounded.
+_FILTER_CACHE = LRUCache(max_entries=1000, default_timeout=0)
+
+
+def register_operator(name, function, numargs=None):
+    """Makes the operator named `name` available in the filters of searches.
+
+    `function` and `numargs` are as described in the documentation for the
+    :class:`Operator` class. For example, to add an operator which matches
+    strings case-insensitively::
+
+        register_operator('ilike', lambda f, a: f.ilike(a))
+
+    If an operator named `name` already exists, it is replaced.
+
+    The SQLAlchemy expressions created by operators are cached and reused for
+    all searches whose arguments have the same types, so the expression
+    returned by `function` may depend on the type of its second argument, but
+    not on its value (other than by including that value as a literal).
+
+    Raises :exc:`ValueError` if `function` does not accept one, two, or three
+    arguments.
+
+    """
+    OPERATORS[name] = Operator(function, numargs)
+    # the cached expressions which used the old operator can no longer be used
+    _FILTER_CACHE.clear()
 
 
 class OrderBy(object):
@@ -162,7 +250,8 @@ class SearchParameters(object):
 
     """
 
-    def __init__(self, filters=None, limit=None, offset=None, order_by=None):
+    def __init__(self, filters=None, limit=None, offset=None, order_by=None,
+                 after=None, before=None):
         """Instantiates this object with the specified attributes.
 
         `filters` is a list of :class:`Filter` objects, representing filters to
@@ -178,11 +267,25 @@ class SearchParameters(object):
         ordering directives to apply to the result set which matches the
         search.
 
+        `after` and `before`, if not ``None``, are lists of values, one for
+        each element of `order_by`, which together specify a position in the
+        ordered result set (a "keyset"). If `after` is specified, only the
+        results which come strictly after that position will match the
+        search. If `before` is specified, only the results which come strictly
+        before that position will match the search, *and the results will be
+        returned in the reverse of the order specified by `order_by`* (so that
+        a limit selects the results closest to the position). At most one of
+        `after` and `before` should be specified. In order for a keyset to
+        identify a unique position, the ordering given by `order_by` must be
+        total, for example by having the primary key as its last element.
+
         """
         self.filters = filters or []
         self.limit = limit
         self.offset = offset
         self.order_by = order_by or []
+        self.after = after
+        self.before = before
 
     def __repr__(self):
         """Returns a string representation of the search parameters."""
@@ -282,11 +385,12 @@ class QueryBuilder(object):
         """
         # raises KeyError if operator not in OPERATORS
         opfunc = OPERATORS[operator]
-        argspec = inspect.getargspec(opfunc)
-        # in Python 2.6 or later, this should be `argspec.args`
-        numargs = len(argspec[0])
+        # operators may have been added to OPERATORS as bare functions
+        if not isinstance(opfunc, Operator):
+            opfunc = Operator(opfunc)
+        numargs = opfunc.numargs
         # raises AttributeError if `fieldname` or `relation` does not exist
-        field = getattr(model, relation or fieldname)
+        field = field_index(model).attribute(relation or fieldname)
         # each of these will raise a TypeError if the wrong number of argments
         # is supplied to `opfunc`.
         if numargs == 1:
@@ -297,6 +401,131 @@ class QueryBuilder(object):
             return opfunc(field, argument)
         return opfunc(field, argument, fieldname)
 
+    @staticmethod
+    def _filters_shape(filters):
+        """Returns a pair whose left element is the *shape* of `filters`, a
+        list of :class:`Filter` objects, and whose right element is a list
+        containing, for each filter, the list of pairs of the form ``(name,
+        value)`` giving the name of the bound parameter which will replace each
+        value in the argument of that filter. If some argument cannot be
+        replaced by bound parameters, this function returns ``None`` instead.
+
+        The shape is a hashable representation of the filters in which each
+        argument is replaced by its type (or, if the argument is a list, a
+        tuple of the types of its elements). Two searches whose filters have
+        the same shape differ only in the values of the bound parameters.
+
+        """
+        shape = []
+        values = []
+        for i, filt in enumerate(filters):
+            argument = filt.argument
+            bound = []
+            if filt.otherfield or argument is None:
+                # the argument is ignored, or is treated specially
+                argument = None
+            elif isinstance(argument, (list, tuple)):
+                for j, value in enumerate(argument):
+                    if not isinstance(value, _BINDABLE_TYPES):
+                        return None
+                    bound.append(('filter_%s_%s' % (i, j), value))
+                argument = tuple([type(value) for value in argument])
+            elif isinstance(argument, _BINDABLE_TYPES):
+                bound.append(('filter_%s' % i, argument))
+                argument = type(argument)
+            else:
+                return None
+            shape.append((filt.fieldname, filt.operator, argument,
+                          filt.otherfield))
+            values.append(bound)
+        return tuple(shape), values
+
+    @staticmethod
+    def _parameterize(expression, values):
+        """Returns a copy of the SQLAlchemy `expression` in which the bound
+        parameters holding the literal values in `values` are renamed so that
+        their values can be provided when the query is executed.
+
+        `values` is a list of pairs of the form ``(name, value)``, as returned
+        in the right element of the pair returned by :func:`_filters_shape`.
+
+        Returns ``None`` if the literal values in `expression` are not exactly
+        the values in `values` (for example, if the operator transforms its
+        argument before comparing it to a field).
+
+        """
+        unmatched = list(values)
+        mismatched = []
+
+        def visit_bindparam(bind):
+            if not bind.unique:
+                return
+            for i, (name, value) in enumerate(unmatched):
+                if type(bind.value) is type(value) and bind.value == value:
+                    bind.key = name
+                    bind.unique = False
+                    del unmatched[i]
+                    return
+            mismatched.append(bind)
+
+        expression = cloned_traverse(expression, {},
+                                     {'bindparam': visit_bindparam})
+        if unmatched or mismatched:
+            return None
+        return expression
+
+    @staticmethod
+    def _create_parameterized_filters(model, search_params):
+        """Returns a pair whose left element is the list of operations on
+        `model` specified in the :attr:`filters` attribute on the
+        `search_params` object, and whose right element is the dictionary of
+        values of the bound parameters in those operations.
+
+        `search-params` is an instance of the :class:`SearchParameters` class
+        whose fields represent the parameters of the search.
+
+        The literal values in the operations are replaced by named bound
+        parameters, so the operations can be reused for all searches whose
+        filters have the same shape (see :func:`_filters_shape`); they are
+        created only once, and cached. The values of the bound parameters must
+        be supplied when executing a query on the returned operations, for
+        example, by using :meth:`sqlalchemy.orm.query.Query.params`.
+
+        If the arguments of the filters cannot be replaced by bound parameters,
+        the operations are created as by :func:`_create_filters`, and are not
+        cached.
+
+        Raises one of :exc:`AttributeError`, :exc:`KeyError`, or
+        :exc:`TypeError` if there is a problem creating the query. See the
+        documentation for :func:`_create_operation` for more information.
+
+        """
+        shaped = QueryBuilder._filters_shape(search_params.filters)
+        if shaped is None:
+            return QueryBuilder._create_filters(model, search_params), {}
+        shape, values = shaped
+        params = {}
+        for bound in values:
+            params.update(bound)
+        # operators may be replaced in OPERATORS directly, in which case the
+        # cached expressions which used the old operator must not be reused
+        operators = tuple([OPERATORS.get(filt[1]) for filt in shape])
+        key = (model, shape, operators)
+        cached = _FILTER_CACHE.get(key)
+        if cached is not None:
+            return cached, params
+        # may raise exception here, in which case nothing is cached
+        filters = QueryBuilder._create_filters(model, search_params)
+        cached = []
+        for filt, bound in zip(filters, values):
+            if bound:
+                filt = QueryBuilder._parameterize(filt, bound)
+                if filt is None:
+                    return filters, {}
+            cached.append(filt)
+        _FILTER_CACHE.set(key, cached)
+        return cached, params
+
     @staticmethod
     def _create_filters(model, search_params):
         """Returns the list of operations on `model` specified in the
@@ -320,13 +549,66 @@ class QueryBuilder(object):
                 relation, fname = fname.split('__')
             # get the other field to which to compare, if it exists
             if filt.otherfield:
-                val = getattr(model, filt.otherfield)
+                val = field_index(model).attribute(filt.otherfield)
             # for the sake of brevity...
             create_op = QueryBuilder._create_operation
             param = create_op(model, fname, filt.operator, val, relation)
             filters.append(param)
         return filters
 
+    @staticmethod
+    def _create_keyset_filter(model, order_by, values, reverse=False,
+                              nulls_first=True):
+        """Returns the filter on `model` which matches exactly those instances
+        which come strictly after the position given by `values` in the
+        ordering given by `order_by` (or strictly before that position, if
+        `reverse` is ``True``).
+
+        `order_by` is a list of :class:`OrderBy` objects and `values` is a list
+        of the same length containing the values of the corresponding fields
+        at the position in the ordering.
+
+        `nulls_first` specifies whether the database sorts ``NULL`` values
+        before all other values (if ``True``) or after all other values (if
+        ``False``) when sorting in ascending order.
+
+        The returned filter is the expansion of the row value comparison
+        ``(f1, f2, ...) > (v1, v2, ...)``, that is, ``f1 > v1 OR (f1 = v1 AND
+        f2 > v2) OR ...``, in which ``>`` is replaced by ``<`` for each field
+        which is sorted in descending order. Unlike a row value comparison,
+        this works on all databases and for mixed sort directions. Since
+        ``NULL`` values cannot be compared, ``f1 > v1`` is replaced by ``f1 IS
+        NOT NULL`` if `v1` is ``None`` and ``NULL`` values come first, and by
+        ``f1 > v1 OR f1 IS NULL`` if ``NULL`` values come last (and similarly
+        for equality).
+
+        Raises :exc:`AttributeError` if no column with the name of one of the
+        fields in `order_by` exists on `model`.
+
+        """
+        clauses = []
+        equalities = []
+        for val, value in zip(order_by, values):
+            field = field_index(model).attribute(val.field)
+            # reversing the direction of the search is the same as reversing
+            # the direction of the ordering
+            ascending = (val.direction == 'asc') != reverse
+            # whether NULL values come before the other values in the ordering
+            nulls_before = nulls_first == ascending
+            if value is None:
+                # no instance comes strictly after a NULL value if NULL values
+                # come last
+                if nulls_before:
+                    clauses.append(and_(*(equalities + [field != None])))
+            else:
+                inequality = field > value if ascending else field < value
+                if not nulls_before:
+                    inequality = or_(inequality, field == None)
+                clauses.append(and_(*(equalities + [inequality])))
+            # comparing to None produces an IS NULL clause
+            equalities.append(field == value)
+        return or_(*clauses)
+
     @staticmethod
     def create_query(session, model, search_params):
         """Builds an SQLAlchemy query instance based on the search parameters
@@ -342,9 +624,10 @@ class QueryBuilder(object):
 
         Building the query proceeds in this order:
         1. filtering the query
-        2. ordering the query
-        3. limiting the query
-        4. offsetting the query
+        2. filtering the query by the keyset, if one is specified
+        3. ordering the query
+        4. limiting the query
+        5. offsetting the query
 
         Raises one of :exc:`AttributeError`, :exc:`KeyError`, or
         :exc:`TypeError` if there is a problem creating the query. See the
@@ -354,14 +637,30 @@ class QueryBuilder(object):
         # Adding field filters
         query = session.query(model)
         # may raise exception here
-        filters = QueryBuilder._create_filters(model, search_params)
+        filters, params = QueryBuilder._create_parameterized_filters(
+            model, search_params)
         for filt in filters:
             query = query.filter(filt)
+        if params:
+            query = query.params(params)
+
+        # Restrict the search to the instances after (or before) a keyset
+        reverse = search_params.before is not None
+        keyset = search_params.before if reverse else search_params.after
+        if keyset is not None:
+            bind = session.get_bind(class_mapper(model))
+            nulls_first = bind.dialect.name in _NULLS_FIRST_DIALECTS
+            keyset_filter = QueryBuilder._create_keyset_filter(
+                model, search_params.order_by, keyset, reverse, nulls_first)
+            query = query.filter(keyset_filter)
 
         # Order the search
         for val in search_params.order_by:
-            field = getattr(model, val.field)
-            direction = getattr(field, val.direction)
+            field = field_index(model).attribute(val.field)
+            direction = val.direction
+            if reverse:
+                direction = 'desc' if direction == 'asc' else 'asc'
+            direction = getattr(field, direction)
             query = query.order_by(direction())
 
         # Limit it
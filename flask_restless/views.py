@@ -16,6 +16,10 @@
       Provides a :http:method:`get` endpoint which returns the result of
       evaluating some function on the entire collection of a given model.
 
+    :class:`flask.ext.restless.views.BatchAPI`
+      Provides a :http:method:`post` endpoint which makes several requests on
+      the other endpoints and responds with all of their responses.
+
     :copyright: 2011 by Lincoln de Sousa <lincoln@comum.org>
     :copyright: 2012 Jeffrey Finkelstein <jeffrey.finkelstein@gmail.com>
     :license: GNU AGPLv3+ or BSD
@@ -23,34 +27,101 @@
 """
 from __future__ import division
 
+import base64
 from collections import defaultdict
+import csv
 import datetime
+from decimal import Decimal
+import hashlib
 import math
+from operator import attrgetter
+from operator import itemgetter
+from StringIO import StringIO
+import sys
+import uuid
 
 from dateutil.parser import parse as parse_datetime
+from dateutil.tz import tzutc
+from flask import _request_ctx_stack
 from flask import abort
+from flask import current_app
 from flask import json
 from flask import jsonify
 from flask import request
+from flask import Response
 from flask.views import MethodView
+from sqlalchemy import and_
+from sqlalchemy import Boolean
+from sqlalchemy import case
 from sqlalchemy import Date
 from sqlalchemy import DateTime
+from sqlalchemy import Integer
+from sqlalchemy import Numeric
+from sqlalchemy import or_
+from sqlalchemy import String
+from sqlalchemy.exc import ArgumentError
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import class_mapper
 from sqlalchemy.orm import ColumnProperty
+from sqlalchemy.orm import defer
+from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import object_mapper
 from sqlalchemy.orm import RelationshipProperty
+from sqlalchemy.orm import subqueryload
 from sqlalchemy.orm.dynamic import AppenderMixin
 from sqlalchemy.orm.exc import MultipleResultsFound
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.orm.properties import RelationshipProperty as RelProperty
+from sqlalchemy.orm.interfaces import MANYTOONE
 from sqlalchemy.orm.query import Query
 from sqlalchemy.sql import func
+from werkzeug.datastructures import Headers
+from werkzeug.test import EnvironBuilder
 
+from .helpers import field_index
 from .helpers import partition
 from .helpers import unicode_keys_to_strings
 from .search import create_query
-from .search import search
+from .search import Filter
+from .search import OPERATORS
+from .search import OrderBy
+from .search import QueryBuilder
+from .search import SearchParameters
+
+try:
+    from flask import stream_with_context
+except ImportError:
+    # Flask versions before 0.9 do not keep the request context around while
+    # a streamed response is generated
+    def stream_with_context(generator):
+        return generator
+
+
+#: The number of instances which are loaded from the database and serialized
+#: together when streaming a response.
+_STREAM_BATCH_SIZE = 500
+
+#: The mimetypes of the formats in which the results of a search may be
+#: provided, in order of preference.
+_SEARCH_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+
+#: The headers which are stored along with the data of a cached response.
+_CACHED_HEADERS = frozenset(('Content-Type', 'ETag', 'Last-Modified', 'Vary'))
+
+#: The names of the JSON encoding libraries which can be specified as the
+#: `json_encoder` of a view, in addition to ``'json'``.
+_JSON_LIBRARIES = frozenset(('simplejson', ))
+
+#: The key in the WSGI environment of a request made by a :class:`BatchAPI`
+#: inside a transaction. Its value is the set of models whose cached responses
+#: must be invalidated when the transaction ends.
+_BATCH_TRANSACTION_KEY = 'flask_restless.batch_transaction'
+
+#: The headers of a batch request which are not copied to the requests made
+#: by the batch (in lowercase).
+_BATCH_EXCLUDED_HEADERS = frozenset(('content-type', 'content-length',
+                                     'if-match', 'if-none-match',
+                                     'if-modified-since',
+                                     'if-unmodified-since'))
 
 
 def jsonify_status_code(status_code, *args, **kw):
@@ -65,17 +136,87 @@ def jsonify_status_code(status_code, *args, **kw):
     return response
 
 
+def _json_default(value):
+    """Returns a representation of `value` which can be serialized as JSON, for
+    use as the ``default`` function of a JSON encoder.
+
+    Dates and times are converted to strings in ISO 8601 format, and
+    :class:`decimal.Decimal` and :class:`uuid.UUID` objects are converted to
+    strings. (A :class:`~decimal.Decimal` is not converted to a floating point
+    number, since that may change its value.)
+
+    """
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError('%r is not JSON serializable' % (value, ))
+
+
+def _json_dumps_function(json_encoder=None, compact=False):
+    """Returns a function which serializes an object to a JSON string, as
+    specified by `json_encoder`.
+
+    The returned function accepts the object to serialize and an optional
+    `indent` keyword argument, which is the number of spaces by which to
+    indent nested objects, or ``None`` to put the whole string on one line.
+    If `compact` is ``True``, the returned function also omits the whitespace
+    after the commas and colons which separate the elements of arrays and
+    objects.
+
+    If `json_encoder` is ``None``, the :mod:`flask.json` module is used (which
+    is :mod:`simplejson` if it is installed). If it is ``'json'``, the
+    :mod:`json` module of the standard library is used. If it is
+    ``'simplejson'``, the :mod:`simplejson` library is used; this function
+    raises :exc:`ImportError` if it is not installed. In these cases,
+    :class:`datetime.datetime`, :class:`decimal.Decimal`, and
+    :class:`uuid.UUID` objects are serialized as described in
+    :func:`_json_default`, except that :mod:`simplejson` serializes
+    :class:`~decimal.Decimal` objects as numbers, exactly.
+
+    If `json_encoder` is callable, it must accept a single object and return
+    its JSON representation as a string; it is used as is, and `indent` is
+    ignored.
+
+    Otherwise, this function raises :exc:`ValueError`.
+
+    """
+    if callable(json_encoder):
+        def dumps(obj, indent=None):
+            return json_encoder(obj)
+        return dumps
+    if json_encoder is None:
+        library = json
+    elif json_encoder == 'json' or json_encoder in _JSON_LIBRARIES:
+        library = __import__(json_encoder)
+    else:
+        raise ValueError('Unknown JSON encoder "%s"' % json_encoder)
+    kw = {}
+    if library.__name__ == 'simplejson':
+        kw['use_decimal'] = True
+
+    def dumps(obj, indent=None):
+        if compact:
+            separators = (',', ':')
+        elif indent is not None:
+            # the default separators leave a space at the end of each line
+            separators = (',', ': ')
+        else:
+            separators = None
+        return library.dumps(obj, default=_json_default, indent=indent,
+                             separators=separators, **kw)
+    return dumps
+
+
 def _is_date_field(model, fieldname):
     """Returns ``True`` if and only if the field of `model` with the specified
     name corresponds to either a :class:`datetime.date` object or a
     :class:`datetime.datetime` object.
 
     """
-    prop = getattr(model, fieldname).property
-    if isinstance(prop, RelationshipProperty):
-        return False
-    fieldtype = prop.columns[0].type
-    return isinstance(fieldtype, Date) or isinstance(fieldtype, DateTime)
+    return fieldname in field_index(model).date_fields
 
 
 def _get_or_create(session, model, **kwargs):
@@ -98,16 +239,113 @@ def _get_or_create(session, model, **kwargs):
     `kwargs` are the keyword arguments which will be passed to the
     :func:`sqlalchemy.orm.query.Query.filter_by` function.
 
+    A created instance is added to `session` and flushed, so that later
+    queries in the same transaction find it, but it is not committed; the
+    calling function has that responsibility.
+
     """
     instance = session.query(model).filter_by(**kwargs).first()
     if instance:
         return instance, False
     instance = model(**kwargs)
     session.add(instance)
-    session.commit()
+    session.flush()
     return instance, True
 
 
+#: The maximum number of values in the dictionaries whose instances are looked
+#: up by a single query in :func:`_find_all` (so that each query has a bounded
+#: number of parameters), and of primary keys whose instances are looked up by
+#: a single query in :meth:`API._get_many`.
+_FIND_BATCH_SIZE = 100
+
+
+def _find_all(query, model, dictionaries):
+    """Returns a list containing, for each dictionary in `dictionaries`, the
+    first instance in `query` (a query on `model`) whose attributes have the
+    values given in the dictionary, or ``None`` if there is no such instance.
+
+    The instances are retrieved by a single query for each hundred values in
+    the distinct dictionaries (see :data:`_FIND_BATCH_SIZE`), instead of one
+    query per dictionary. The query also reports which of the dictionaries
+    each instance matches, so the instances are matched with the dictionaries
+    by the database, exactly as by
+    :meth:`sqlalchemy.orm.query.Query.filter_by` (for example, converting the
+    values to the types of the columns and using the collations of the
+    columns), instead of by comparing values in Python.
+
+    `dictionaries` is a list of dictionaries whose keys are strings naming
+    columns of `model`.
+
+    """
+    # the distinct dictionaries, in order, keyed by their hashable forms
+    keys = []
+    wanted = {}
+    for dictionary in dictionaries:
+        key = _hashable(dictionary)
+        if key not in wanted:
+            keys.append(key)
+            wanted[key] = dictionary
+    found = {}
+    for key in keys:
+        if not wanted[key]:
+            found[key] = query.first()
+    keys = [key for key in keys if wanted[key]]
+    # each value in a dictionary is a parameter of the query
+    numvalues = max([len(wanted[key]) for key in keys] or [1])
+    size = max(1, _FIND_BATCH_SIZE // numvalues)
+    for start in range(0, len(keys), size):
+        batch = keys[start:start + size]
+        criteria = [and_(*[getattr(model, name) == value
+                           for name, value in wanted[key].iteritems()])
+                    for key in batch]
+        names = set(frozenset(wanted[key]) for key in batch)
+        if len(names) == 1 and len(list(names)[0]) == 1:
+            # the common case of a single attribute is a single IN clause
+            name = list(list(names)[0])[0]
+            values = [wanted[key][name] for key in batch]
+            criterion = getattr(model, name).in_(values)
+        else:
+            criterion = or_(*criteria)
+        matches = [case([(c, 1)], else_=0) for c in criteria]
+        for row in query.filter(criterion).add_columns(*matches):
+            for key, matched in zip(batch, row[1:]):
+                if matched and key not in found:
+                    found[key] = row[0]
+    return [found.get(_hashable(dictionary)) for dictionary in dictionaries]
+
+
+def _get_or_create_all(session, model, dictionaries):
+    """Returns a list containing, for each dictionary in `dictionaries`, the
+    first instance of the specified model whose attributes have the values
+    given in the dictionary, or a new instance of the model with those
+    attributes if there is no such instance.
+
+    Unlike calling :func:`_get_or_create` for each dictionary, the existing
+    instances are retrieved as described in :func:`_find_all`, and equal
+    dictionaries get the same instance. The created instances are added to
+    `session` and flushed together, in the order of `dictionaries`, so that
+    later queries in the same transaction find them, but they are not
+    committed; the calling function has that responsibility.
+
+    `dictionaries` is a list of dictionaries whose keys are strings naming
+    columns of `model`.
+
+    """
+    instances = _find_all(session.query(model), model, dictionaries)
+    created = {}
+    for i, dictionary in enumerate(dictionaries):
+        if instances[i] is None:
+            key = _hashable(dictionary)
+            if key not in created:
+                created[key] = model(**dictionary)
+                session.add(created[key])
+            instances[i] = created[key]
+    if created:
+        session.flush()
+    return instances
+
+
 def _get_columns(model):
     """Returns a dictionary-like object containing all the columns of the
     specified `model` class.
@@ -121,13 +359,136 @@ def _get_related_model(model, relationname):
     whose name is `relationname`.
 
     """
-    return _get_columns(model)[relationname].property.mapper.class_
+    return field_index(model).related_models[relationname]
 
 
 def _get_relations(model):
     """Returns a list of relation names of `model` (as a list of strings)."""
-    cols = _get_columns(model)
-    return [k for k in cols if isinstance(cols[k].property, RelProperty)]
+    return list(field_index(model).relations)
+
+
+def _eager_load_options(model, deep, prefix='', collections=True):
+    """Returns a list of SQLAlchemy loader options which cause the relations
+    of `model` specified by `deep` to be loaded along with the instances of
+    `model` in a query, instead of by a separate query for each instance.
+
+    `deep` is a dictionary of the form accepted by :func:`_to_dict`. Each
+    relation which is rendered as a list is loaded using a single additional
+    query (see :func:`sqlalchemy.orm.subqueryload`) and each relation which is
+    rendered as a single object is loaded using a join on the original query
+    (see :func:`sqlalchemy.orm.joinedload`). Dynamically loaded relations are
+    not loaded eagerly, since they are queries instead of lists of instances.
+
+    `prefix` is the dot-separated path from the queried model to `model`; it is
+    used when recursively computing the loader options for nested relations.
+
+    If `collections` is ``False``, relations which are rendered as a list are
+    not loaded eagerly. This is necessary when the results of the query are
+    fetched in batches (see :meth:`sqlalchemy.orm.query.Query.yield_per`),
+    since a collection may span more than one batch.
+
+    """
+    options = []
+    for relation, rdeep in (deep or {}).iteritems():
+        prop = _get_columns(model)[relation].property
+        if prop.lazy == 'dynamic' or (prop.uselist and not collections):
+            continue
+        path = prefix + relation
+        loader = subqueryload if prop.uselist else joinedload
+        options.append(loader(path))
+        if isinstance(rdeep, dict):
+            submodel = prop.mapper.class_
+            options.extend(_eager_load_options(submodel, rdeep, path + '.',
+                                               collections))
+    return options
+
+
+def _required_columns(mapper, relation=None):
+    """Returns the set of columns of the model of `mapper` which must be loaded
+    for the instances of the model to behave correctly, even if they are not
+    included in the JSON representation of the instances.
+
+    These are the primary key columns, the column which determines the
+    polymorphic identity of an instance (if any), and the columns which are
+    used to load the related instances of each relation.
+
+    If `relation` is not ``None``, it is a relationship property whose related
+    model is the model of `mapper`, and the columns which are used to load the
+    related instances across that relationship are also included.
+
+    """
+    columns = set(mapper.primary_key)
+    if mapper.polymorphic_on is not None:
+        columns.add(mapper.polymorphic_on)
+    for prop in mapper.iterate_properties:
+        if isinstance(prop, RelationshipProperty):
+            columns.update(local for local, remote in prop.local_remote_pairs)
+    if relation is not None:
+        columns.update(remote for local, remote in relation.local_remote_pairs)
+    return columns
+
+
+def _deferred_columns(model, exclude=None, include=None, relation=None):
+    """Returns the names of the columns of `model` which will not be included
+    in the JSON representation of its instances, as determined by `include`
+    and `exclude` (see :func:`_to_dict`), and which therefore need not be
+    loaded from the database.
+
+    Columns which are required for the instances of the model to be loaded
+    correctly are never included in the returned list; see
+    :func:`_required_columns` for the meaning of `relation`.
+
+    """
+    if exclude is None and include is None:
+        return []
+    mapper = class_mapper(model)
+    required = _required_columns(mapper, relation)
+    deferred = []
+    for prop in mapper.iterate_properties:
+        if not isinstance(prop, ColumnProperty):
+            continue
+        if include is not None and prop.key in include:
+            continue
+        if include is None and prop.key not in exclude:
+            continue
+        if required.intersection(prop.columns):
+            continue
+        deferred.append(prop.key)
+    return deferred
+
+
+def _defer_options(model, deep=None, exclude=None, include=None,
+                   exclude_relations=None, include_relations=None):
+    """Returns a list of SQLAlchemy loader options which prevent the columns of
+    `model` and of the related models specified by `deep` from being loaded
+    from the database if they will not be included in the JSON representation
+    of the instances of `model`.
+
+    This makes a significant difference for models with many columns or with
+    large text or binary columns, when only a few of the columns will be
+    included in the response.
+
+    The arguments are the same as the arguments to :func:`_to_dict`, except
+    that `model` is a model class instead of an instance of a model.
+
+    """
+    options = [defer(key) for key in _deferred_columns(model, exclude,
+                                                       include)]
+    mapper = class_mapper(model)
+    for relation in deep or {}:
+        newexclude = None
+        newinclude = None
+        if exclude_relations is not None and relation in exclude_relations:
+            newexclude = exclude_relations[relation]
+        elif include_relations is not None and relation in include_relations:
+            newinclude = include_relations[relation]
+        prop = mapper.get_property(relation)
+        if prop.lazy == 'dynamic':
+            continue
+        deferred = _deferred_columns(prop.mapper.class_, newexclude,
+                                     newinclude, prop)
+        options.extend(defer('%s.%s' % (relation, key)) for key in deferred)
+    return options
 
 
 def _primary_key_name(model_or_instance):
@@ -147,10 +508,215 @@ def _primary_key_name(model_or_instance):
     return 'id' if 'id' in primary_key_names else primary_key_names[0]
 
 
+def _isoformat(value):
+    """Returns the ISO 8601 string representation of `value`, a
+    :class:`datetime.date` or :class:`datetime.datetime` object.
+
+    """
+    return value.isoformat()
+
+
+def _isoformat_if_date(value):
+    """Returns the ISO 8601 string representation of `value` if it is a
+    :class:`datetime.date` or :class:`datetime.datetime` object, or `value`
+    itself otherwise.
+
+    """
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def _column_converter(column):
+    """Returns the function which converts a value of the specified `column`
+    into a value which can be serialized as JSON, or ``None`` if no conversion
+    is necessary.
+
+    Dates and times are converted to strings in ISO 8601 format. Columns of
+    types which are not known to this function (for example, user-defined
+    types) are checked for date values on each conversion.
+
+    """
+    columntype = column.type
+    if isinstance(columntype, (Date, DateTime)):
+        return _isoformat
+    if isinstance(columntype, (Boolean, Integer, Numeric, String)):
+        return None
+    return _isoformat_if_date
+
+
+class _Serializer(object):
+    """A precomputed plan for converting instances of a SQLAlchemy model into
+    dictionaries, for use as the JSON representation of the instances.
+
+    Creating a serializer inspects the mapper of the model, applies the
+    included and excluded columns, chooses a converter for each column, and
+    recursively creates the serializers for the related models which will be
+    rendered. Calling the serializer on an instance simply executes this plan,
+    so a single serializer should be created for each combination of
+    arguments and reused for each instance.
+
+    The arguments to the constructor of this class are the same as the
+    arguments to :func:`_to_dict`, except that `model` is a model class
+    instead of an instance of a model, and the additional `convert_dates`
+    argument.
+
+    """
+
+    def __init__(self, model, deep=None, exclude=None, include=None,
+                 exclude_relations=None, include_relations=None,
+                 convert_dates=True, omit_nulls=False):
+        """Creates the serialization plan for `model`.
+
+        For more information on the arguments, see :func:`_to_dict`.
+
+        If `convert_dates` is ``False``, the values of date and time columns
+        are left as :class:`datetime.date` and :class:`datetime.datetime`
+        objects instead of being converted to strings, for use with JSON
+        encoders which serialize them directly (see :func:`_json_default`).
+
+        If `omit_nulls` is ``True``, fields whose value is ``None`` are not
+        included in the returned dictionaries, including the dictionaries
+        representing related instances.
+
+        """
+        if (exclude is not None or exclude_relations is not None) and \
+                (include is not None or include_relations is not None):
+            raise ValueError('Cannot specify both include and exclude.')
+        self.model = model
+        self.arguments = (deep, exclude, include, exclude_relations,
+                          include_relations, convert_dates, omit_nulls)
+        self.omit_nulls = omit_nulls
+        mapper = class_mapper(model)
+        # determine the columns, filtered by the exclude and include values,
+        # and the function which converts each of their values to JSON
+        columns = [p for p in mapper.iterate_properties
+                   if isinstance(p, ColumnProperty)]
+        if exclude is not None:
+            columns = [p for p in columns if p.key not in exclude]
+        elif include is not None:
+            columns = [p for p in columns if p.key in include]
+        self.columns = tuple(p.key for p in columns)
+        if convert_dates:
+            converters = [(p.key, _column_converter(p.columns[0]))
+                          for p in columns]
+        else:
+            converters = [(p.key, None) for p in columns]
+        self.plain_columns = tuple(key for key, convert in converters
+                                   if convert is None)
+        self.converted_columns = tuple((key, convert)
+                                       for key, convert in converters
+                                       if convert is not None)
+        # the values of the columns which need no conversion are retrieved all
+        # at once by a single call to an `itemgetter` on the dictionary of
+        # loaded attributes of an instance, or by a single call to an
+        # `attrgetter` if some of those attributes are not loaded
+        keys = self.plain_columns
+        # getters of a single item return the item instead of a tuple, so
+        # repeat the key; the extra value is dropped by `zip` below
+        if len(keys) == 1:
+            keys = keys + keys
+        self._get_loaded = itemgetter(*keys) if keys else lambda d: ()
+        self._get_attributes = attrgetter(*keys) if keys else lambda i: ()
+        # create the plans for each of the `deep` relations
+        relations = []
+        for relation, rdeep in (deep or {}).iteritems():
+            # Determine the included and excluded fields for the related
+            # model.
+            newexclude = None
+            newinclude = None
+            if exclude_relations is not None and relation in exclude_relations:
+                newexclude = exclude_relations[relation]
+            elif (include_relations is not None and
+                  relation in include_relations):
+                newinclude = include_relations[relation]
+            # Do some black magic on SQLAlchemy to decide if the related
+            # instance should be rendered as a list or as a single object.
+            prop = mapper.get_property(relation)
+            serializer = _Serializer(prop.mapper.class_, rdeep,
+                                     exclude=newexclude, include=newinclude,
+                                     convert_dates=convert_dates,
+                                     omit_nulls=omit_nulls)
+            relations.append((relation, prop.uselist, serializer))
+        self.relations = tuple(relations)
+        # the plans for subclasses of `model`, created when first needed
+        self._subclass_serializers = {}
+
+    def _for_subclass(self, subclass):
+        """Returns the serializer for instances of `subclass`, a subclass of
+        the model of this serializer, with the same arguments.
+
+        Instances of subclasses (for example, in the case of joined table
+        inheritance) may have additional columns.
+
+        """
+        serializer = self._subclass_serializers.get(subclass)
+        if serializer is None:
+            serializer = _Serializer(subclass, *self.arguments)
+            self._subclass_serializers[subclass] = serializer
+        return serializer
+
+    def __call__(self, instance):
+        """Returns a dictionary representing the fields of the specified
+        `instance` of the model of this serializer.
+
+        """
+        if instance.__class__ is not self.model:
+            return self._for_subclass(instance.__class__)(instance)
+        # create the dictionary mapping column name to value
+        try:
+            values = self._get_loaded(instance.__dict__)
+        except KeyError:
+            values = self._get_attributes(instance)
+        result = dict(zip(self.plain_columns, values))
+        for key, convert in self.converted_columns:
+            value = getattr(instance, key)
+            if value is not None:
+                value = convert(value)
+            result[key] = value
+        # recursively serialize each of the `deep` relations
+        for relation, uselist, serialize in self.relations:
+            # Get the related value so we can see if it is None, a list, a
+            # query (as specified by a dynamic relationship loader), or an
+            # actual instance of a model.
+            relatedvalue = getattr(instance, relation)
+            if relatedvalue is None:
+                result[relation] = None
+            elif uselist:
+                result[relation] = [serialize(inst) for inst in relatedvalue]
+            else:
+                # If the related value is dynamically loaded, resolve the
+                # query to get the single instance.
+                if isinstance(relatedvalue, Query):
+                    relatedvalue = relatedvalue.one()
+                result[relation] = serialize(relatedvalue)
+        if self.omit_nulls:
+            return dict((k, v) for k, v in result.iteritems() if v is not None)
+        return result
+
+
+def _hashable(value):
+    """Returns a hashable representation of `value`, in which all lists (and
+    other iterables) have been recursively replaced by tuples and all
+    dictionaries by sorted tuples of their items.
+
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.iteritems()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+
+#: The cache of serializers created by :func:`_to_dict`, keyed by model and
+#: (hashable) arguments.
+_SERIALIZERS = {}
+
+
 # This code was adapted from :meth:`elixir.entity.Entity.to_dict` and
 # http://stackoverflow.com/q/1958219/108197.
 def _to_dict(instance, deep=None, exclude=None, include=None,
-             exclude_relations=None, include_relations=None):
+             exclude_relations=None, include_relations=None, omit_nulls=False):
     """Returns a dictionary representing the fields of the specified `instance`
     of a SQLAlchemy model.
 
@@ -181,58 +747,22 @@ def _to_dict(instance, deep=None, exclude=None, include=None,
     names of fields on the related model which should be included in the
     returned dictionary; `exclude_relations` is similar.
 
+    If `omit_nulls` is ``True``, fields whose value is ``None`` are not
+    included in the returned dictionary (or in the dictionaries representing
+    related instances).
+
+    This function reuses the :class:`_Serializer` created for previous calls
+    with the same model and arguments.
+
     """
-    if (exclude is not None or exclude_relations is not None) and \
-            (include is not None or include_relations is not None):
-        raise ValueError('Cannot specify both include and exclude.')
-    # create the dictionary mapping column name to value
-    columns = (p.key for p in object_mapper(instance).iterate_properties
-               if isinstance(p, ColumnProperty))
-    # filter the columns based on exclude and include values
-    if exclude is not None:
-        columns = (c for c in columns if c not in exclude)
-    elif include is not None:
-        columns = (c for c in columns if c in include)
-    result = dict((col, getattr(instance, col)) for col in columns)
-    # Convert datetime and date objects to ISO 8601 format.
-    #
-    # TODO We can get rid of this when issue #33 is resolved.
-    for key, value in result.items():
-        if isinstance(value, datetime.date):
-            result[key] = value.isoformat()
-    # recursively call _to_dict on each of the `deep` relations
-    deep = deep or {}
-    for relation, rdeep in deep.iteritems():
-        # Get the related value so we can see if it is None, a list, a query
-        # (as specified by a dynamic relationship loader), or an actual
-        # instance of a model.
-        relatedvalue = getattr(instance, relation)
-        if relatedvalue is None:
-            result[relation] = None
-            continue
-        # Determine the included and excluded fields for the related model.
-        newexclude = None
-        newinclude = None
-        if exclude_relations is not None and relation in exclude_relations:
-            newexclude = exclude_relations[relation]
-        elif (include_relations is not None and
-              relation in include_relations):
-            newinclude = include_relations[relation]
-        # Do some black magic on SQLAlchemy to decide if the related instance
-        # should be rendered as a list or as a single object.
-        uselist = instance._sa_class_manager[relation].property.uselist
-        if uselist:
-            result[relation] = [_to_dict(inst, rdeep, exclude=newexclude,
-                                         include=newinclude)
-                                for inst in relatedvalue]
-            continue
-        # If the related value is dynamically loaded, resolve the query to get
-        # the single instance.
-        if isinstance(relatedvalue, Query):
-            relatedvalue = relatedvalue.one()
-        result[relation] = _to_dict(relatedvalue, rdeep, exclude=newexclude,
-                                    include=newinclude)
-    return result
+    model = object_mapper(instance).class_
+    arguments = (deep, exclude, include, exclude_relations, include_relations,
+                 True, omit_nulls)
+    key = (model, _hashable(arguments))
+    serializer = _SERIALIZERS.get(key)
+    if serializer is None:
+        serializer = _SERIALIZERS[key] = _Serializer(model, *arguments)
+    return serializer(instance)
 
 
 def _parse_includes(column_names):
@@ -297,7 +827,104 @@ def _parse_excludes(column_names):
     return columns, relations
 
 
-def _evaluate_functions(session, model, functions):
+def _encode_cursor(direction, instance, order_by):
+    """Returns an opaque string which encodes the position of `instance` in
+    the ordering given by `order_by`, for use as a keyset pagination cursor.
+
+    `direction` is either ``'after'`` or ``'before'``, specifying whether the
+    cursor refers to the instances which come after or before `instance`.
+
+    `order_by` is a list of :class:`~flask.ext.restless.search.OrderBy`
+    objects whose fields are fields of `instance`.
+
+    The returned string can be decoded by :func:`_decode_cursor`.
+
+    """
+    values = []
+    for val in order_by:
+        value = getattr(instance, val.field)
+        if isinstance(value, datetime.date):
+            value = value.isoformat()
+        values.append(value)
+    return base64.urlsafe_b64encode(json.dumps([direction, values]))
+
+
+def _decode_cursor(cursor):
+    """Returns the pair ``(direction, values)`` encoded in `cursor`, a string
+    created by :func:`_encode_cursor`.
+
+    `direction` is either ``'after'`` or ``'before'`` and `values` is the list
+    of values of the fields by which the search is ordered. Date and time
+    values are returned as strings in ISO 8601 format.
+
+    Raises :exc:`ValueError` if `cursor` is not a valid cursor.
+
+    """
+    try:
+        direction, values = json.loads(base64.urlsafe_b64decode(str(cursor)))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('Invalid cursor')
+    if direction not in ('after', 'before') or not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return direction, values
+
+
+def _estimate_count(session, query):
+    """Returns the number of rows which the query planner of the database
+    estimates `query` will return, or ``None`` if the database does not
+    provide such an estimate.
+
+    Currently, only PostgreSQL provides an estimate, which is read from the
+    output of ``EXPLAIN``. This is much cheaper than counting the rows on
+    large tables, but it may be inaccurate, especially for complex filters or
+    for tables which have not been analyzed recently.
+
+    """
+    connection = session.connection()
+    dialect = connection.dialect
+    if dialect.name != 'postgresql':
+        return None
+    compiled = query.statement.compile(dialect=dialect)
+    explain = 'EXPLAIN (FORMAT JSON) %s' % compiled
+    plan = connection.execute(explain, compiled.params).scalar()
+    # depending on the version of psycopg2, JSON may or may not be decoded
+    if isinstance(plan, basestring):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _aggregated_field(model, fieldname, relations):
+    """Returns the attribute of `model` (or of a model related to it) named
+    by `fieldname`, for use in a query evaluating SQL functions.
+
+    A field of a related model is named ``'<relation>__<fieldname>'``; the
+    attribute of `model` which defines the relation is then appended to the
+    list `relations` (if it is not already in it), so that the query can be
+    joined with the related model.
+
+    Raises :exc:`AttributeError` with a ``field`` attribute which is
+    `fieldname` if no such field exists.
+
+    """
+    try:
+        if '__' in fieldname:
+            relation, name = fieldname.split('__', 1)
+            relationfield = field_index(model).attribute(relation)
+            related_model = field_index(model).related_models[relation]
+            field = field_index(related_model).attribute(name)
+            if relationfield not in relations:
+                relations.append(relationfield)
+        else:
+            field = field_index(model).attribute(fieldname)
+    except (AttributeError, KeyError):
+        exception = AttributeError(fieldname)
+        exception.field = fieldname
+        raise exception
+    return field
+
+
+def _evaluate_functions(session, model, functions, group_by=None, having=None,
+                        order_by=None, limit=None, filters=None):
     """Executes each of the SQLAlchemy functions specified in ``functions``, a
     list of dictionaries of the form described below, on the given model and
     returns a dictionary mapping function name (slightly modified, see below)
@@ -327,41 +954,130 @@ def _evaluate_functions(session, model, functions):
     ``None`` or `functions` is empty, this function returns the empty
     dictionary.
 
+    If `group_by` is a non-empty list of names of fields, the functions are
+    instead evaluated on each group of instances which have the same values of
+    those fields, by a single ``GROUP BY`` query. A field of a related model is
+    named ``'<relation>__<fieldname>'``. The return value is then a list
+    containing a dictionary for each group, mapping the name of each field in
+    `group_by` to its value and ``'<funcname>__<fieldname>'`` to the result of
+    evaluating that function on the instances in the group. In this case:
+
+    * `having` is a list of dictionaries of the form accepted by
+      :meth:`flask.ext.restless.search.Filter.from_dictionary`, in which the
+      name of the field is one of the names in the returned dictionaries; only
+      the groups which meet all of them are returned,
+    * `order_by` is a list of dictionaries of the form accepted by the
+      constructor of :class:`flask.ext.restless.search.OrderBy`, in which the
+      name of the field is one of the names in the returned dictionaries, and
+    * `limit` is the maximum number of groups to return.
+
+    If `filters` is a list of dictionaries of the form accepted by
+    :meth:`flask.ext.restless.search.Filter.from_dictionary` (that is, the
+    filters of a search), the functions are evaluated only on the instances
+    which meet all of them.
+
     If a field does not exist on a given model, :exc:`AttributeError` is
     raised. If a function does not exist,
     :exc:`sqlalchemy.exc.OperationalError` is raised. The former exception will
     have a ``field`` attribute which is the name of the field which does not
     exist. The latter exception will have a ``function`` attribute which is the
-    name of the function with does not exist.
+    name of the function with does not exist. If an operator in `having` or
+    `filters` does not exist, :exc:`KeyError` is raised. If one of the
+    filters is not a dictionary, :exc:`TypeError` is raised, and if the
+    argument of an operator is invalid or missing, :exc:`TypeError` or
+    :exc:`sqlalchemy.exc.ArgumentError` may be raised.
 
     """
-    if not model or not functions:
+    if not model or not (functions or group_by):
         return {}
     processed = []
     funcnames = []
-    for function in functions:
+    # the relations with which the query must be joined
+    relations = []
+    # the expressions for the group fields and the results of the functions,
+    # by name, for use in the HAVING and ORDER BY clauses
+    labeled = {}
+    for fieldname in group_by or ():
+        field = _aggregated_field(model, fieldname, relations)
+        funcnames.append(fieldname)
+        processed.append(field)
+        labeled[fieldname] = field
+    for function in functions or ():
         funcname, fieldname = function['name'], function['field']
         # We retrieve the function by name from the SQLAlchemy ``func``
         # module and the field by name from the model class.
         #
         # If the specified field doesn't exist, this raises AttributeError.
         funcobj = getattr(func, funcname)
-        try:
-            field = getattr(model, fieldname)
-        except AttributeError, exception:
-            exception.field = fieldname
-            raise exception
+        field = _aggregated_field(model, fieldname, relations)
         # Time to store things to be executed. The processed list stores
         # functions that will be executed in the database and funcnames
         # contains names of the entries that will be returned to the
         # caller.
         funcnames.append('%s__%s' % (funcname, fieldname))
         processed.append(funcobj(field))
+        labeled[funcnames[-1]] = processed[-1]
+
+    def labeled_expression(name):
+        if name not in labeled:
+            exception = AttributeError(name)
+            exception.field = name
+            raise exception
+        return labeled[name]
+
+    query = session.query(*processed).select_from(model)
+    for relation in relations:
+        query = query.join(relation)
+    if filters:
+        # otherwise, parsing a filter raises an AttributeError which does not
+        # name a field
+        if not all(isinstance(filt, dict) for filt in filters):
+            raise TypeError('Each filter must be a dictionary')
+        search_params = SearchParameters.from_dictionary(dict(filters=filters))
+        # check the names of the fields first, so that the exception raised
+        # for a field which does not exist names the field
+        for filt in search_params.filters:
+            for fieldname in filt.fieldname, filt.otherfield:
+                if fieldname:
+                    _aggregated_field(model, fieldname, [])
+        # the filters are created in the same way (and cached in the same
+        # way) as the filters of a search
+        filters, params = \
+            QueryBuilder._create_parameterized_filters(model, search_params)
+        for filt in filters:
+            query = query.filter(filt)
+        if params:
+            query = query.params(params)
+    if group_by:
+        query = query.group_by(*processed[:len(group_by)])
+        for filt in having or ():
+            if not isinstance(filt, dict):
+                raise TypeError('Each filter must be a dictionary')
+            operator = OPERATORS[filt.get('op')]
+            if operator.numargs != 1 and 'val' not in filt:
+                raise TypeError('Operator "%s" requires an argument' %
+                                filt['op'])
+            filt = Filter.from_dictionary(filt)
+            field = labeled_expression(filt.fieldname)
+            if operator.numargs == 1:
+                query = query.having(operator(field))
+            else:
+                query = query.having(operator(field, filt.argument))
+        for val in order_by or ():
+            val = OrderBy(**val)
+            if val.direction not in ('asc', 'desc'):
+                raise ValueError('Unknown direction "%s"' % val.direction)
+            field = labeled_expression(val.field)
+            query = query.order_by(getattr(field, val.direction)())
+        if limit is not None:
+            query = query.limit(int(limit))
     # Evaluate all the functions at once and get an iterable of results.
     #
     # If any of the functions
     try:
-        evaluated = session.query(*processed).one()
+        if group_by:
+            return [dict(zip(funcnames, row)) for row in query]
+        evaluated = query.one()
     except OperationalError, exception:
         # HACK original error message is of the form:
         #
@@ -378,18 +1094,24 @@ class ModelView(MethodView):
     of a SQLAlchemy model.
 
     The model class for this view can be accessed from the :attr:`model`
-    attribute, and the session in which all database transactions will be
-    performed when dealing with this model can be accessed from the
-    :attr:`session` attribute.
+    attribute, the :class:`~flask.ext.restless.helpers.FieldIndex` describing
+    its fields from the :attr:`fields` attribute, and the session in which
+    all database transactions will be performed when dealing with this model
+    can be accessed from the :attr:`session` attribute.
 
     When subclasses wish to make queries to the database model specified in the
     constructor, they should access the ``self.query`` function, which
     delegates to the appropriate SQLAlchemy query object or Flask-SQLAlchemy
     query object, depending on how the model has been defined.
 
+    Subclasses should create JSON responses using the :meth:`jsonify` and
+    :meth:`jsonify_status_code` methods, which serialize the response data
+    using the JSON encoder specified in the constructor.
+
     """
 
-    def __init__(self, session, model, *args, **kw):
+    def __init__(self, session, model, json_encoder=None, compact_json=False,
+                 *args, **kw):
         """Calls the constructor of the superclass and specifies the model for
         which this class provides a ReSTful API.
 
@@ -399,10 +1121,78 @@ class ModelView(MethodView):
         `model` is the SQLALchemy declarative model class of the database model
         for which this instance of the class is an API.
 
+        `json_encoder` specifies the function which serializes response data
+        to JSON, as described in :func:`_json_dumps_function`.
+
+        If `compact_json` is ``True``, JSON responses contain no insignificant
+        whitespace; otherwise, they are indented (except in responses to
+        requests made with :class:`XMLHttpRequest`).
+
+        .. versionadded:: 0.9
+           Added the `json_encoder` and `compact_json` keyword arguments.
+
         """
         super(ModelView, self).__init__(*args, **kw)
         self.session = session
         self.model = model
+        self.fields = field_index(model)
+        self.compact_json = compact_json
+        self.dumps = _json_dumps_function(json_encoder, compact_json)
+        # the built-in encoders serialize dates themselves, but a function
+        # provided by the user may not
+        self.encodes_dates = not callable(json_encoder)
+
+    @classmethod
+    def as_view(cls, name, *class_args, **class_kwargs):
+        """Returns a view function which dispatches each request to a single
+        instance of this class, constructed with the specified arguments.
+
+        Unlike :meth:`flask.views.View.as_view`, which constructs a new
+        instance of the class for each request, this method constructs it
+        only once, so the keyword arguments are parsed and the information
+        computed from them (for example, the plan for serializing instances of
+        the model) is created only once, when the view is created. Therefore
+        the methods of this class must not store any information about a
+        request on the instance.
+
+        The returned function has the same attributes as the one returned by
+        :meth:`flask.views.View.as_view`.
+
+        """
+        instance = cls(*class_args, **class_kwargs)
+
+        def view(*args, **kwargs):
+            return instance.dispatch_request(*args, **kwargs)
+
+        for decorator in cls.decorators:
+            view = decorator(view)
+        view.view_class = cls
+        view.view_instance = instance
+        view.__name__ = name
+        view.__doc__ = cls.__doc__
+        view.__module__ = cls.__module__
+        view.methods = cls.methods
+        return view
+
+    def jsonify(self, *args, **kw):
+        """Returns a response containing the JSON representation of the
+        dictionary created from the specified arguments, like
+        :func:`flask.jsonify`, but serialized by the JSON encoder of this view.
+
+        """
+        indent = None if self.compact_json or request.is_xhr else 2
+        return current_app.response_class(self.dumps(dict(*args, **kw),
+                                                     indent=indent),
+                                          mimetype='application/json')
+
+    def jsonify_status_code(self, status_code, *args, **kw):
+        """Returns a response created by :meth:`jsonify` with the specified
+        HTTP status code.
+
+        """
+        response = self.jsonify(*args, **kw)
+        response.status_code = status_code
+        return response
 
     def query(self, model=None):
         """Returns either a SQLAlchemy query or Flask-SQLAlchemy query object
@@ -437,19 +1227,31 @@ class FunctionAPI(ModelView):
         try:
             data = json.loads(request.args.get('q')) or {}
         except (TypeError, ValueError, OverflowError):
-            return jsonify_status_code(400, message='Unable to decode data')
+            return self.jsonify_status_code(400,
+                                            message='Unable to decode data')
         try:
             result = _evaluate_functions(self.session, self.model,
-                                         data.get('functions'))
+                                         data.get('functions'),
+                                         group_by=data.get('group_by'),
+                                         having=data.get('having'),
+                                         order_by=data.get('order_by'),
+                                         limit=data.get('limit'),
+                                         filters=data.get('filters'))
+            if data.get('group_by'):
+                # for security purposes, don't transmit list as top-level JSON
+                return self.jsonify(objects=result)
             if not result:
-                return jsonify_status_code(204)
-            return jsonify(result)
+                return self.jsonify_status_code(204)
+            return self.jsonify(result)
         except AttributeError, exception:
             message = 'No such field "%s"' % exception.field
-            return jsonify_status_code(400, message=message)
+            return self.jsonify_status_code(400, message=message)
         except OperationalError, exception:
             message = 'No such function "%s"' % exception.function
-            return jsonify_status_code(400, message=message)
+            return self.jsonify_status_code(400, message=message)
+        except (ArgumentError, KeyError, TypeError, ValueError):
+            message = 'Unable to construct query'
+            return self.jsonify_status_code(400, message=message)
 
 
 class API(ModelView):
@@ -464,7 +1266,10 @@ class API(ModelView):
                  authentication_function=None, exclude_columns=None,
                  include_columns=None, validation_exceptions=None,
                  results_per_page=10, post_form_preprocessor=None,
-                 custom_save_method=None, *args, **kw):
+                 custom_save_method=None, keyset_pagination=False,
+                 count_mode='exact', stream_results=False, json_encoder=None,
+                 compact_json=False, omit_nulls=False, version_column=None,
+                 last_modified_column=None, cache=None, *args, **kw):
 
         """Instantiates this view with the specified attributes.
 
@@ -527,6 +1332,56 @@ class API(ModelView):
         is not read from the post parameters (where malicious user can tamper
         with them) but from the session.
 
+        If `keyset_pagination` is ``True`` and pagination is enabled, responses
+        to :http:method:`get` requests on the collection will be paginated
+        using cursors which encode the position of the first and last instances
+        on each page, instead of using page numbers. For more information, see
+        :ref:`keysetpagination`.
+
+        `count_mode` specifies how the total number of results is computed
+        for paginated responses. It is one of ``'exact'`` (count the results
+        using a ``COUNT`` query), ``'estimated'`` (use the estimate from the
+        query planner of the database, if the database provides one) or
+        ``'skipped'`` (do not count the results at all). For more information,
+        see :ref:`countmode`.
+
+        If `stream_results` is ``True`` and pagination is disabled, responses
+        to :http:method:`get` requests on the collection are streamed to the
+        client in batches of instances as they are loaded from the database,
+        so the memory used to produce the response does not depend on the
+        number of results. For more information, see :ref:`streaming`.
+
+        If `omit_nulls` is ``True``, fields whose value is ``None`` are not
+        included in the JSON representations of instances of the model (or of
+        related instances).
+
+        For information on `json_encoder` and `compact_json`, see
+        :class:`ModelView`.
+
+        `version_column` and `last_modified_column` are the names of columns
+        of `model` which change whenever the JSON representation of an
+        instance changes: a version number (or any other value which is
+        changed on each update) and the date and time of the last update,
+        respectively. If either is specified, the ``ETag`` and
+        ``Last-Modified`` headers of responses to :http:method:`get` requests
+        are computed from these columns using an aggregate query, so a
+        :http:statuscode:`304` response can be made without loading or
+        serializing any instances. Otherwise, the ``ETag`` header is a hash of
+        the response data. For more information, see :ref:`conditional`.
+
+        `cache` is a :class:`~flask.ext.restless.cache.ResponseCache` in which
+        responses to :http:method:`get` requests are stored, or ``None`` if
+        responses should not be cached. The stored responses which involve
+        the model (or the models related to it) are invalidated whenever a
+        :http:method:`post`, :http:method:`patch`, :http:method:`put`, or
+        :http:method:`delete` request on this API changes the database. For
+        more information, see :ref:`caching`.
+
+        .. versionadded:: 0.9
+           Added the `keyset_pagination`, `count_mode`, `stream_results`,
+           `json_encoder`, `compact_json`, `omit_nulls`, `version_column`,
+           `last_modified_column`, and `cache` keyword arguments.
+
         .. versionadded:: 0.7
            Added the `exclude_columns` keyword argument.
 
@@ -542,7 +1397,8 @@ class API(ModelView):
            `authentication_function` keyword arguments.
 
         """
-        super(API, self).__init__(session, model, *args, **kw)
+        super(API, self).__init__(session, model, json_encoder, compact_json,
+                                  *args, **kw)
         self.authentication_required_for = authentication_required_for or ()
         self.authentication_function = authentication_function
         # convert HTTP method names to uppercase
@@ -556,10 +1412,88 @@ class API(ModelView):
         self.results_per_page = results_per_page
         self.paginate = (isinstance(self.results_per_page, int)
                          and self.results_per_page > 0)
+        self.keyset_pagination = keyset_pagination and self.paginate
+        self.count_mode = count_mode
+        self.stream_results = stream_results and not self.paginate
+        self.version_column = version_column
+        self.last_modified_column = last_modified_column
+        self.cache = cache
+        # the models whose instances may appear in responses from, or be
+        # changed by requests to, this API
+        self.cached_models = [self.model]
+        for relation in self.fields.relations:
+            related_model = self.fields.related_models[relation]
+            if related_model not in self.cached_models:
+                self.cached_models.append(related_model)
+        # the names of all the relations of the model
+        self.relations = frozenset(self.fields.relations)
+        # create a placeholder for the relations of the returned models
+        relations = self.relations
+        # do not follow relations that will not be included in the response
+        if self.include_columns is not None:
+            cols = frozenset(self.include_columns)
+            rels = frozenset(self.include_relations)
+            relations &= (cols | rels)
+        elif self.exclude_columns is not None:
+            relations -= frozenset(self.exclude_columns)
+        self.deep = dict((r, {}) for r in relations)
+        # create the plan for converting instances of the model to JSON once,
+        # instead of inspecting the model for each serialized instance
+        self.serialize = _Serializer(self.model, self.deep,
+                                     exclude=self.exclude_columns,
+                                     exclude_relations=self.exclude_relations,
+                                     include=self.include_columns,
+                                     include_relations=self.include_relations,
+                                     convert_dates=not self.encodes_dates,
+                                     omit_nulls=omit_nulls)
+        # the plan for converting instances to rows of comma-separated values,
+        # which do not include relations
+        self.serialize_columns = _Serializer(self.model,
+                                             exclude=self.exclude_columns,
+                                             include=self.include_columns)
+        # the options which cause exactly the columns and relations which will
+        # be included in the response to be loaded
+        defer_options = \
+            _defer_options(self.model, self.deep,
+                           exclude=self.exclude_columns,
+                           exclude_relations=self.exclude_relations,
+                           include=self.include_columns,
+                           include_relations=self.include_relations)
+        eager_options = _eager_load_options(self.model, self.deep)
+        streaming_eager_options = \
+            _eager_load_options(self.model, self.deep, collections=False)
+        self.loader_options = eager_options + defer_options
+        self.streaming_loader_options = streaming_eager_options + defer_options
+        # whether some related instances are loaded by a subquery (see
+        # _search)
+        self.loads_collections = \
+            len(eager_options) > len(streaming_eager_options)
         self.post_form_preprocessor = post_form_preprocessor
 
         self.custom_save_method = custom_save_method
 
+    def _related_instances(self, submodel, dictionaries):
+        """Returns a list containing the instance of `submodel` specified by
+        each dictionary in `dictionaries`.
+
+        If a dictionary contains the key ``'id'``, the instance is the one with
+        that primary key (or ``None`` if there is no such instance). Otherwise,
+        the instance is retrieved or created as described in
+        :func:`_get_or_create_all`. The instances with the specified primary
+        keys are retrieved as described in :func:`_find_all`, and the other
+        existing instances by one more query.
+
+        """
+        pk_name = str(_primary_key_name(submodel))
+        ids = [{pk_name: dictionary['id']} for dictionary in dictionaries
+               if 'id' in dictionary]
+        byid = iter(_find_all(self.query(submodel), submodel, ids))
+        others = [unicode_keys_to_strings(dictionary)
+                  for dictionary in dictionaries if 'id' not in dictionary]
+        others = iter(_get_or_create_all(self.session, submodel, others))
+        return [byid.next() if 'id' in dictionary else others.next()
+                for dictionary in dictionaries]
+
     def _add_to_relation(self, query, relationname, toadd=None):
         """Adds a new or existing related model to each model specified by
         `query`.
@@ -583,13 +1517,9 @@ class API(ModelView):
 
         """
         submodel = _get_related_model(self.model, relationname)
-        for dictionary in toadd or []:
-            if 'id' in dictionary:
-                subinst = self._get_by(dictionary['id'], submodel)
-            else:
-                kw = unicode_keys_to_strings(dictionary)
-                subinst = _get_or_create(self.session, submodel, **kw)[0]
-            for instance in query:
+        subinst_list = self._related_instances(submodel, toadd or [])
+        for instance in query:
+            for subinst in subinst_list:
                 getattr(instance, relationname).append(subinst)
 
     def _remove_from_relation(self, query, relationname, toremove=None):
@@ -654,14 +1584,7 @@ class API(ModelView):
 
         """
         submodel = _get_related_model(self.model, relationname)
-        subinst_list = []
-        for dictionary in toset or []:
-            if 'id' in dictionary:
-                subinst = self._get_by(dictionary['id'], submodel)
-            else:
-                kw = unicode_keys_to_strings(dictionary)
-                subinst = _get_or_create(self.session, submodel, **kw)[0]
-            subinst_list.append(subinst)
+        subinst_list = self._related_instances(submodel, toset or [])
         for instance in query:
             setattr(instance, relationname, subinst_list)
 
@@ -702,8 +1625,7 @@ class API(ModelView):
         specified query.
 
         """
-        relations = _get_relations(self.model)
-        tochange = frozenset(relations) & frozenset(params)
+        tochange = self.relations & frozenset(params)
         for columnname in tochange:
             if isinstance(params[columnname], list):
                 toset = params[columnname]
@@ -716,6 +1638,55 @@ class API(ModelView):
                                            toremove=toremove)
         return tochange
 
+    def _can_update_in_bulk(self, params):
+        """Returns ``True`` if and only if setting the fields specified in
+        `params` on many instances of the model can be done by a single
+        ``UPDATE`` statement, without loading the instances.
+
+        This is the case only if each of the fields is a column, and nothing
+        would happen in Python when the fields are set on an instance or the
+        instance is flushed (for example, the model has no validators and no
+        listeners for update events). The model must also be mapped to a
+        single table and must not have a version counter.
+
+        """
+        columns = self.fields.columns
+        if not all(field in columns for field in params):
+            return False
+        mapper = class_mapper(self.model)
+        if len(mapper.tables) != 1 or mapper.version_id_col is not None:
+            return False
+        if mapper.dispatch.before_update or mapper.dispatch.after_update:
+            return False
+        # validators are implemented as listeners for the set event
+        attributes = self.fields.attributes
+        return not any(attributes[field].dispatch.set for field in params)
+
+    def _can_delete_in_bulk(self):
+        """Returns ``True`` if and only if many instances of the model can be
+        deleted by a single ``DELETE`` statement, without loading them.
+
+        This is the case only if the model is mapped to a single table, has no
+        listeners for delete events, and deleting an instance would not cause
+        SQLAlchemy to change other rows. Relationships to many instances (and
+        relationships which cascade deletes) require the latter to be loaded,
+        unless the relationship has been configured with ``passive_deletes``,
+        in which case the database is responsible for them.
+
+        """
+        mapper = class_mapper(self.model)
+        if len(mapper.tables) != 1:
+            return False
+        if mapper.dispatch.before_delete or mapper.dispatch.after_delete:
+            return False
+        for prop in mapper.iterate_properties:
+            if not isinstance(prop, RelationshipProperty) or \
+                    prop.passive_deletes:
+                continue
+            if prop.direction is not MANYTOONE or prop.cascade.delete:
+                return False
+        return True
+
     def _handle_validation_exception(self, exception):
         """Rolls back the session, extracts validation error messages, and
         returns a :func:`flask.jsonify` response with :http:statuscode:`400`
@@ -728,7 +1699,7 @@ class API(ModelView):
         self.session.rollback()
         errors = self._extract_error_messages(exception) or \
             'Could not determine specific validation errors'
-        return jsonify_status_code(400, validation_errors=errors)
+        return self.jsonify_status_code(400, validation_errors=errors)
 
     def _extract_error_messages(self, exception):
         """Tries to extract a dictionary mapping field name to validation error
@@ -779,7 +1750,7 @@ class API(ModelView):
         """
         result = {}
         for fieldname, value in dictionary.iteritems():
-            if _is_date_field(self.model, fieldname) and value is not None:
+            if fieldname in self.fields.date_fields and value is not None:
                 result[fieldname] = parse_datetime(value)
             else:
                 result[fieldname] = value
@@ -855,50 +1826,105 @@ class API(ModelView):
         try:
             data = json.loads(request.args.get('q', '{}'))
         except (TypeError, ValueError, OverflowError):
-            return jsonify_status_code(400, message='Unable to decode data')
+            return self.jsonify_status_code(400,
+                                            message='Unable to decode data')
+
+        is_single = data.get('single')
+        mimetype = request.accept_mimetypes.best_match(_SEARCH_MIMETYPES,
+                                                       'application/json')
+        if (self.keyset_pagination and not is_single and
+                mimetype == 'application/json'):
+            return self._keyset_paginated(data)
 
         # perform a filtered search
+        #
+        # If the client expects a single result, the search is executed
+        # immediately; otherwise, only the query is created here, and the
+        # pagination code below is responsible for limiting the rows which are
+        # actually loaded from the database.
+        #
+        # The related instances which are loaded by a subquery are those of
+        # the rows of the subquery, which are only the same as the rows of a
+        # limited query if the query has a well-defined order.
+        if self.loads_collections and not is_single and \
+                not data.get('order_by') and \
+                (self.paginate or data.get('limit') or data.get('offset')):
+            data['order_by'] = [dict(field=_primary_key_name(self.model))]
         try:
-            result = search(self.session, self.model, data)
+            result = create_query(self.session, self.model, data)
+            if is_single:
+                # may raise NoResultFound or MultipleResultsFound
+                result = self._with_loader_options(result).one()
         except NoResultFound:
-            return jsonify(message='No result found')
+            return self.jsonify(message='No result found')
         except MultipleResultsFound:
-            return jsonify(message='Multiple results found')
+            return self.jsonify(message='Multiple results found')
         except:
-            return jsonify_status_code(400,
-                                       message='Unable to construct query')
-
-        # create a placeholder for the relations of the returned models
-        relations = frozenset(_get_relations(self.model))
-        # do not follow relations that will not be included in the response
-        if self.include_columns is not None:
-            cols = frozenset(self.include_columns)
-            rels = frozenset(self.include_relations)
-            relations &= (cols | rels)
-        elif self.exclude_columns is not None:
-            relations -= frozenset(self.exclude_columns)
-        deep = dict((r, {}) for r in relations)
-
-        # for security purposes, don't transmit list as top-level JSON
-        if isinstance(result, list):
-            return self._paginated(result, deep)
+            message = 'Unable to construct query'
+            return self.jsonify_status_code(400, message=message)
+
+        if is_single:
+            return self.jsonify(self.serialize(result))
+        if mimetype == 'application/x-ndjson':
+            return self._ndjson(result, data.get('limit'))
+        if mimetype == 'text/csv':
+            return self._csv(result, data.get('limit'))
+        if self.paginate:
+            # the response depends only on the instances on the requested page
+            # (and the next one, which determines whether there is a next
+            # page) and on the total number of instances
+            start, end = self._page_bounds(data.get('limit'))
+            page = result.slice(start, end + 1) if 0 <= start < end else None
+            validators = self._validators(page, result)
         else:
-            result = _to_dict(result, deep, exclude=self.exclude_columns,
-                              exclude_relations=self.exclude_relations,
-                              include=self.include_columns,
-                              include_relations=self.include_relations)
-            return jsonify(result)
-
-    # TODO it is ugly to have `deep` as an arg here; can we remove it?
-    def _paginated(self, instances, deep):
-        """Returns a paginated JSONified response from the specified list of
-        model instances.
-
-        `instances` is a list of model instances.
+            validators = self._validators(result)
+        if validators is not None:
+            response = self._not_modified(validators, True)
+            if response is not None:
+                return response
+        # for security purposes, don't transmit list as top-level JSON
+        response = self._paginated(result, data.get('limit'))
+        if validators is not None:
+            self._set_validators(response, validators)
+        return response
+
+    def _count(self, query):
+        """Returns a pair whose left element is the number of instances in
+        `query` and whose right element is the method by which that number was
+        computed, according to the ``count_mode`` specified in the constructor
+        of this class.
+
+        The right element is one of ``'exact'``, ``'estimated'``, or
+        ``'skipped'``. In the latter case, the left element is ``None``. If the
+        count mode is ``'estimated'`` but the database does not provide an
+        estimate, the exact number is computed instead.
 
-        `deep` is the dictionary which defines the depth of submodels to output
-        in the JSON format of the model instances in `instances`; it is passed
-        directly to :func:`_to_dict`.
+        """
+        if self.count_mode == 'skipped':
+            return None, 'skipped'
+        if self.count_mode == 'estimated':
+            estimate = _estimate_count(self.session, query)
+            if estimate is not None:
+                return estimate, 'estimated'
+        return query.count(), 'exact'
+
+    def _paginated(self, query, limit=None):
+        """Returns a paginated JSONified response from the specified query on
+        the model.
+
+        `query` is a SQLAlchemy query which evaluates to the (possibly
+        limited and offset) list of all model instances which match the search
+        parameters.
+
+        If pagination is enabled, only the rows on the requested page are
+        loaded from the database (using ``LIMIT`` and ``OFFSET``), and the
+        total number of results is computed by a separate query according to
+        the ``count_mode`` specified in the constructor of this class, so the
+        cost of this method is proportional to the number of results per page
+        instead of to the total number of results.
+
+        `limit` is the limit which has been applied to `query` as requested by
+        the client, or ``None`` if the client did not request one.
 
         The response data is JSON of the form:
 
@@ -908,29 +1934,429 @@ class API(ModelView):
              "page": 2,
              "total_pages": 3,
              "num_results": 8,
+             "count_mode": "exact",
              "objects": [{"id": 1, "name": "Jeffrey", "age": 24}, ...]
            }
 
+        If the count mode is ``'skipped'``, the ``"total_pages"`` and
+        ``"num_results"`` mappings are replaced by a ``"has_more"`` mapping
+        whose value is ``true`` if and only if there is a next page.
+
         """
-        num_results = len(instances)
         if self.paginate:
+            # this count respects the limit and offset requested by the client
+            num_results, count_mode = self._count(query)
             # get the page number (first page is page 1)
             page_num = int(request.args.get('page', 1))
             start = (page_num - 1) * self.results_per_page
-            end = min(num_results, start + self.results_per_page)
-            total_pages = int(math.ceil(num_results / self.results_per_page))
+            end = start + self.results_per_page
+            if count_mode == 'exact':
+                end = min(num_results, end)
+            else:
+                # fetch one extra instance to determine whether there is a
+                # next page
+                if count_mode == 'skipped':
+                    end += 1
+                if limit:
+                    end = min(limit, end)
+            # `Query.slice` adds `start` to the offset requested by the client
+            # and `end` never exceeds the number of results, so the limit
+            # requested by the client is respected as well
+            if 0 <= start < end:
+                query = self._with_loader_options(query.slice(start, end))
+                instances = query.all()
+            else:
+                instances = []
+            has_more = len(instances) > self.results_per_page
+            instances = instances[:self.results_per_page]
+            if num_results is not None:
+                total_pages = int(math.ceil(num_results /
+                                            self.results_per_page))
+        elif self.stream_results:
+            return self._streamed(query)
         else:
+            instances = self._with_loader_options(query).all()
+            num_results = len(instances)
+            count_mode = 'exact'
             page_num = 1
-            start = 0
-            end = num_results
             total_pages = 1
-        objects = [_to_dict(x, deep, exclude=self.exclude_columns,
-                            exclude_relations=self.exclude_relations,
-                            include=self.include_columns,
-                            include_relations=self.include_relations)
-                   for x in instances[start:end]]
-        return jsonify(page=page_num, objects=objects, total_pages=total_pages,
-                       num_results=num_results)
+        objects = [self.serialize(x) for x in instances]
+        result = dict(page=page_num, objects=objects, count_mode=count_mode)
+        if count_mode == 'skipped':
+            result['has_more'] = has_more
+        else:
+            result.update(num_results=num_results, total_pages=total_pages)
+        return self.jsonify(result)
+
+    def _streamed(self, query):
+        """Returns a response which streams the JSON representation of all
+        the instances in `query` to the client.
+
+        The instances are loaded from the database in batches (see
+        :meth:`sqlalchemy.orm.query.Query.yield_per`) and each batch is
+        serialized and sent to the client before the next one is loaded, so
+        neither the instances nor their JSON representations are ever all in
+        memory at once. Relations which are rendered as a list are loaded
+        lazily, since they cannot be loaded eagerly in batches.
+
+        The response data has the same form as the response data of
+        :meth:`_paginated` when pagination is disabled.
+
+        """
+        serialize = self.serialize
+        dumps = self.dumps
+        # the separators which the JSON encoder puts between the elements of
+        # an array and between the keys and the values of an object
+        separator = dumps([0, 0])[2:-2]
+        key_separator = dumps({'a': 0})[4:-2]
+        # the beginning of the object, without its closing brace
+        header = dumps(dict(page=1, total_pages=1, count_mode='exact'))[:-1]
+        header += separator + dumps('objects') + key_separator + '['
+        footer = ']' + separator + dumps('num_results') + key_separator
+
+        def generate():
+            yield header
+            num_results = 0
+            for batch in self._batches(query):
+                if num_results:
+                    yield separator
+                yield separator.join(dumps(serialize(x)) for x in batch)
+                num_results += len(batch)
+            yield footer + dumps(num_results) + '}'
+
+        return Response(stream_with_context(generate()),
+                        mimetype='application/json')
+
+    def _batches(self, query, limit=None):
+        """Yields the instances in `query` which belong in the response to the
+        current request, as a sequence of lists of instances.
+
+        If pagination is enabled, this yields only the instances on the page
+        specified by the ``page`` query parameter of the request, as a single
+        list; `limit` is the limit which has been applied to `query` as
+        requested by the client, or ``None`` if the client did not request
+        one. Otherwise, this yields all the instances in `query` in lists of
+        at most :data:`_STREAM_BATCH_SIZE` instances, loading each list from
+        the database only when it is needed (see :meth:`_streamed`).
+
+        """
+        if self.paginate:
+            start, end = self._page_bounds(limit)
+            if 0 <= start < end:
+                query = self._with_loader_options(query.slice(start, end))
+                yield query.all()
+            return
+        query = query.options(*self.streaming_loader_options)
+        batch = []
+        for instance in query.yield_per(_STREAM_BATCH_SIZE):
+            batch.append(instance)
+            if len(batch) == _STREAM_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _page_bounds(self, limit=None):
+        """Returns the pair ``(start, end)`` of indices (in the list of all the
+        instances which match the search) of the first instance on the page
+        specified by the ``page`` query parameter of the request and of the
+        instance after the last one on that page.
+
+        `limit` is the limit requested by the client, or ``None`` if the
+        client did not request one. If the page is empty, `start` is not less
+        than `end`.
+
+        """
+        page_num = int(request.args.get('page', 1))
+        start = (page_num - 1) * self.results_per_page
+        end = start + self.results_per_page
+        if limit:
+            end = min(limit, end)
+        return start, end
+
+    def _ndjson(self, query, limit=None):
+        """Returns a response which streams the JSON representation of each of
+        the instances in `query` to the client, one per line (in the format
+        known as `newline delimited JSON <http://ndjson.org>`_).
+
+        Unlike the response from :meth:`_paginated`, the response contains no
+        pagination metadata. If pagination is enabled, only the instances on
+        the requested page are included; otherwise, all the instances are
+        streamed as they are loaded from the database. For more information
+        on `limit`, see :meth:`_batches`.
+
+        """
+        serialize = self.serialize
+
+        def generate():
+            for batch in self._batches(query, limit):
+                yield ''.join(self.dumps(serialize(x)) + '\n' for x in batch)
+
+        return Response(stream_with_context(generate()),
+                        mimetype='application/x-ndjson')
+
+    def _csv(self, query, limit=None):
+        """Returns a response which streams the instances in `query` to the
+        client as comma-separated values, one instance per row.
+
+        The first row contains the names of the columns of the model which are
+        included in the JSON representation of the instances; relations are
+        not included. Dates are written in ISO 8601 format and ``None`` is
+        written as the empty string. The instances included in the response
+        are the same as those included by :meth:`_ndjson`.
+
+        """
+        serialize = self.serialize_columns
+        columns = serialize.columns
+
+        def encode(value):
+            if value is None:
+                return ''
+            if isinstance(value, unicode):
+                return value.encode('utf-8')
+            return value
+
+        def generate():
+            buf = StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(columns)
+            for batch in self._batches(query, limit):
+                for instance in batch:
+                    row = serialize(instance)
+                    writer.writerow([encode(row[c]) for c in columns])
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            yield buf.getvalue()
+
+        return Response(stream_with_context(generate()), mimetype='text/csv')
+
+    def _keyset_paginated(self, data):
+        """Returns a JSONified response containing a page of the model
+        instances which match the search parameters given by `data`, where the
+        page is specified by the ``cursor`` query parameter of the request.
+
+        `data` is the dictionary of search parameters provided by the client.
+        The ``limit`` and ``offset`` search parameters are ignored.
+
+        The ordering requested by the client is made total by appending the
+        primary key of the model to it, and the page is selected by a filter
+        on the values of the fields of that ordering, so fetching a page costs
+        the same regardless of how deep into the result set it is.
+
+        The response data is JSON of the form:
+
+        .. sourcecode:: javascript
+
+           {
+             "num_results": 8,
+             "total_pages": 3,
+             "count_mode": "exact",
+             "next": "WyJhZnRlciIsIFs1XV0=",
+             "prev": "WyJiZWZvcmUiLCBbMl1d",
+             "objects": [{"id": 2, "name": "Jeffrey", "age": 24}, ...]
+           }
+
+        in which ``"next"`` and ``"prev"`` are cursors for the next and
+        previous pages, or ``null`` if there is no such page. As in
+        :meth:`_paginated`, the ``"total_pages"`` and ``"num_results"``
+        mappings are omitted if the count mode is ``'skipped'``.
+
+        """
+        try:
+            search_params = SearchParameters.from_dictionary(data)
+        except:
+            message = 'Unable to construct query'
+            return self.jsonify_status_code(400, message=message)
+        order_by = search_params.order_by
+        pk_name = _primary_key_name(self.model)
+        if pk_name not in (val.field for val in order_by):
+            order_by.append(OrderBy(pk_name))
+        search_params.limit = search_params.offset = None
+        direction = None
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            try:
+                direction, values = _decode_cursor(cursor)
+            except ValueError:
+                message = 'Unable to decode cursor'
+                return self.jsonify_status_code(400, message=message)
+            if len(values) != len(order_by):
+                message = 'Unable to decode cursor'
+                return self.jsonify_status_code(400, message=message)
+            # convert date strings back into the corresponding Python objects
+            values = [parse_datetime(value) if value is not None and
+                      val.field in self.fields.date_fields else value
+                      for val, value in zip(order_by, values)]
+        try:
+            count_query = create_query(self.session, self.model, search_params)
+            num_results, count_mode = self._count(count_query)
+            if direction is not None:
+                setattr(search_params, direction, values)
+            # fetch one extra instance to determine whether there is another
+            # page in the direction of the search
+            search_params.limit = self.results_per_page + 1
+            query = create_query(self.session, self.model, search_params)
+            instances = self._with_loader_options(query).all()
+        except:
+            message = 'Unable to construct query'
+            return self.jsonify_status_code(400, message=message)
+        has_more = len(instances) > self.results_per_page
+        instances = instances[:self.results_per_page]
+        # searches before a cursor return instances in the reverse order
+        if direction == 'before':
+            instances.reverse()
+        next_cursor = prev_cursor = None
+        if instances:
+            first, last = instances[0], instances[-1]
+            if direction == 'before' or has_more:
+                next_cursor = _encode_cursor('after', last, order_by)
+            if direction == 'after' or (direction == 'before' and has_more):
+                prev_cursor = _encode_cursor('before', first, order_by)
+        objects = [self.serialize(x) for x in instances]
+        result = dict(objects=objects, count_mode=count_mode,
+                      next=next_cursor, prev=prev_cursor)
+        if num_results is not None:
+            total_pages = int(math.ceil(num_results / self.results_per_page))
+            result.update(num_results=num_results, total_pages=total_pages)
+        return self.jsonify(result)
+
+    def _with_loader_options(self, query):
+        """Returns `query` with options which cause the relations which will be
+        included in the response to be loaded in a fixed number of queries,
+        instead of one query per relation per instance when the instances are
+        serialized, and which cause the columns which will not be included in
+        the response not to be loaded at all.
+
+        """
+        return query.options(*self.loader_options)
+
+    def _validators(self, query, count_query=None):
+        """Returns a pair whose left element is the entity tag and whose right
+        element is the date of last modification of the instances in `query`,
+        as computed from the version column and the last modified column
+        specified in the constructor of this class.
+
+        If `count_query` is not ``None``, the number of instances in it (as
+        computed by :meth:`_count`) is included in the entity tag, so that a
+        page of a collection can be validated by the instances on that page
+        (given by `query`) and the total number of instances. If `query` is
+        ``None``, there are no instances.
+
+        If neither column was specified, this method returns ``None``. If only
+        one of them was specified, the other element of the pair is ``None``.
+
+        Instead of loading the instances, this method makes a single query for
+        the primary key and the version of each instance (and the latest of
+        their modification dates), and the entity tag is a hash of the
+        versions in order of primary key (and of the number of instances in
+        `count_query`, which is computed by an aggregate query), so it changes
+        whenever an instance in `query` is added, removed, or updated. If only
+        the last modified column was specified, the modification dates are
+        aggregated by the database; the latest date does not change when an
+        instance is removed, so it must not be used to validate a collection
+        (see :meth:`_make_conditional`).
+
+        """
+        if self.version_column is None and self.last_modified_column is None:
+            return None
+        pk = self.fields.attribute(_primary_key_name(self.model))
+        columns = [pk.label('pk')]
+        if self.version_column is not None:
+            column = self.fields.attribute(self.version_column)
+            columns.append(column.label('version'))
+        if self.last_modified_column is not None:
+            column = self.fields.attribute(self.last_modified_column)
+            columns.append(column.label('last_modified'))
+        etag = None
+        last_modified = None
+        if query is None:
+            subquery = None
+        else:
+            subquery = query.with_entities(*columns).subquery()
+        if self.version_column is None:
+            if subquery is not None:
+                last_modified = self.session.query(
+                    func.max(subquery.c.last_modified)).scalar()
+        else:
+            digest = hashlib.md5()
+            if count_query is not None:
+                digest.update(repr(self._count(count_query)[0]))
+            rows = []
+            if subquery is not None:
+                rows = self.session.query(subquery).order_by(subquery.c.pk)
+            for row in rows:
+                digest.update(repr((row.pk, row.version)))
+                if self.last_modified_column is not None and \
+                        row.last_modified is not None and \
+                        (last_modified is None or
+                         row.last_modified > last_modified):
+                    last_modified = row.last_modified
+            etag = digest.hexdigest()
+        # HTTP dates are in UTC
+        if last_modified is not None and last_modified.tzinfo is not None:
+            last_modified = last_modified.astimezone(tzutc())
+            last_modified = last_modified.replace(tzinfo=None)
+        return etag, last_modified
+
+    def _set_validators(self, response, validators):
+        """Sets the ``ETag`` and ``Last-Modified`` headers of `response` to
+        the values given by `validators`, a pair as returned by
+        :meth:`_validators`, and returns `response`.
+
+        """
+        etag, last_modified = validators
+        if etag is not None:
+            response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        return response
+
+    def _not_modified(self, validators, collection=False):
+        """Returns a :http:statuscode:`304` response if the conditional
+        headers of the current request match `validators`, a pair as returned
+        by :meth:`_validators`, or ``None`` otherwise.
+
+        If `collection` is ``True``, the date of last modification is not
+        compared, as described in :meth:`_make_conditional`.
+
+        """
+        etag, last_modified = validators
+        if collection:
+            last_modified = None
+        if etag is None and last_modified is None:
+            return None
+        response = current_app.response_class()
+        self._set_validators(response, (etag, last_modified))
+        response.make_conditional(request)
+        return response if response.status_code == 304 else None
+
+    def _make_conditional(self, response, collection=False):
+        """Makes `response`, a response to a :http:method:`get` request,
+        conditional on the ``If-None-Match`` and ``If-Modified-Since`` headers
+        of the request, and returns it.
+
+        If `response` has no ``ETag`` header yet, it is set to a hash of the
+        response data. Error responses and streamed responses are returned
+        unchanged.
+
+        If `collection` is ``True``, the ``If-Modified-Since`` header is
+        ignored, since the latest modification date of the instances in a
+        collection does not change when one of them is removed.
+
+        """
+        if response.status_code != 200 or response.is_streamed:
+            return response
+        response.add_etag()
+        if not collection:
+            return response.make_conditional(request)
+        # the Last-Modified header is still sent, but not compared
+        last_modified = response.headers.get('Last-Modified')
+        del response.headers['Last-Modified']
+        response.make_conditional(request)
+        if last_modified is not None and response.status_code == 200:
+            response.headers['Last-Modified'] = last_modified
+        return response
 
     def _check_authentication(self):
         """If the specified HTTP method requires authentication (see the
@@ -956,13 +2382,83 @@ class API(ModelView):
         pk_name = str(_primary_key_name(the_model))
         return self.query(the_model).filter_by(**{pk_name: primary_key_value})
 
-    def _get_by(self, primary_key_value, model=None):
+    def _get_by(self, primary_key_value, model=None, query=None):
         """Returns the single instance of `model` (or ``self.model`` if not
         specified) whose primary key has the value `primary_key_value`, or
         ``None`` if no such instance exists.
 
+        `query` is the query on `model` from which the instance is retrieved;
+        if it is not specified, the query returned by :meth:`query` is used.
+
+        If the model has a single primary key column and the instance is
+        already present in the session, it is returned without querying the
+        database. If the model has a composite primary key, the first instance
+        whose primary key named by :func:`_primary_key_name` has the value
+        `primary_key_value` is returned instead.
+
+        """
+        the_model = model or self.model
+        if query is None:
+            query = self.query(the_model)
+        if len(class_mapper(the_model).primary_key) == 1:
+            return query.get(primary_key_value)
+        # force unicode primary key name to string; see unicode_keys_to_strings
+        pk_name = str(_primary_key_name(the_model))
+        return query.filter_by(**{pk_name: primary_key_value}).first()
+
+    def _cache_key(self, instid):
+        """Returns the key under which the response to the current request
+        for the instance of the model with the specified ID (or to the current
+        search, if `instid` is ``None``) is stored in the cache.
+
+        The key depends on the endpoint, the query parameters of the request
+        (with the search parameters in a normalized form), the format of the
+        response requested by the client, and the state of the models on
+        which the response depends.
+
+        """
+        args = []
+        for name, value in sorted(request.args.iteritems(multi=True)):
+            if name == 'q':
+                try:
+                    value = json.dumps(json.loads(value), sort_keys=True)
+                except (TypeError, ValueError, OverflowError):
+                    pass
+            args.append((name, value))
+        mimetype = request.accept_mimetypes.best_match(_SEARCH_MIMETYPES,
+                                                       'application/json')
+        request_key = (request.endpoint, instid, args, mimetype,
+                       request.is_xhr)
+        return self.cache.key(request_key, self.cached_models)
+
+    def _commit(self):
+        """Commits the changes made in the session to the database.
+
+        If the current request is made by a :class:`BatchAPI` inside a
+        transaction, the changes are only flushed instead, so that they are
+        visible to the later requests of the batch but are committed (or
+        rolled back) by the :class:`BatchAPI` when the batch ends.
+
         """
-        return self._query_by_primary_key(primary_key_value, model).first()
+        if _BATCH_TRANSACTION_KEY in request.environ:
+            self.session.flush()
+        else:
+            self.session.commit()
+
+    def _invalidate_cache(self):
+        """Invalidates the cached responses which depend on the model of this
+        API or on the models related to it, if responses are being cached.
+
+        This should be called after each change to the database.
+
+        """
+        if self.cache is not None:
+            self.cache.invalidate(self.cached_models)
+            # the responses cached before the end of a batch transaction must
+            # be invalidated again when it ends
+            pending = request.environ.get(_BATCH_TRANSACTION_KEY)
+            if pending is not None:
+                pending.update(self.cached_models)
 
     def get(self, instid):
         """Returns a JSON representation of an instance of model with the
@@ -977,28 +2473,152 @@ class API(ModelView):
         model with that identifying integer. If no such instance exists, this
         method responds with :http:status:`404`.
 
+        If ``instid`` is ``None`` and the request has an ``ids`` query
+        parameter, this method returns the instances with the primary keys
+        listed in it instead, as described in :meth:`_get_many`.
+
+        If a cache was specified in the constructor of this class, successful
+        responses are stored in the cache and reused for identical requests
+        until the database is changed by this API or another one for a
+        related model.
+
         """
         self._check_authentication()
+        # the database may contain changes which have not been committed yet
+        if self.cache is None or _BATCH_TRANSACTION_KEY in request.environ:
+            return self._get(instid)
+        key = self._cache_key(instid)
+        cached = self.cache.get(key)
+        if cached is not None:
+            data, headers = cached
+            response = current_app.response_class(data, headers=headers)
+            return self._make_conditional(response, instid is None)
+        response = self._get(instid)
+        if response.status_code == 200 and not response.is_streamed:
+            headers = [(name, value) for name, value in response.headers
+                       if name in _CACHED_HEADERS]
+            self.cache.set(key, (response.data, headers))
+        return response
+
+    def _get_many(self):
+        """Returns a response containing the JSON representation of each
+        instance of the model whose primary key is in the comma-separated list
+        of primary keys in the ``ids`` query parameter of the request.
+
+        The instances (and the related instances included in the response) are
+        loaded by a fixed number of queries for each hundred distinct primary
+        keys (see :data:`_FIND_BATCH_SIZE`), so that the number of parameters
+        of each query is bounded. The instances appear in the response in the
+        order in which their primary keys appear in the request, and the
+        primary keys for which there is no instance are listed in the
+        response. For more information, see :ref:`multiget`.
+
+        """
+        pk_name = _primary_key_name(self.model)
+        ids = [instid for instid in request.args['ids'].split(',') if instid]
+        if isinstance(self.fields.columns.get(pk_name), Integer):
+            try:
+                ids = [int(instid) for instid in ids]
+            except ValueError:
+                return self.jsonify_status_code(400,
+                                                message='Unable to decode ids')
+        found = {}
+        pk = getattr(self.model, pk_name)
+        query = self._with_loader_options(self.query())
+        distinct_ids = list(set(ids))
+        for start in range(0, len(distinct_ids), _FIND_BATCH_SIZE):
+            batch = distinct_ids[start:start + _FIND_BATCH_SIZE]
+            for instance in query.filter(pk.in_(batch)):
+                found[getattr(instance, pk_name)] = instance
+        objects = [self.serialize(found[instid]) for instid in ids
+                   if instid in found]
+        missing = [instid for instid in ids if instid not in found]
+        return self.jsonify(objects=objects, missing=missing)
+
+    def _get(self, instid):
+        """Returns the response to a :http:method:`get` request, as described
+        in :meth:`get`, without using the cache.
+
+        """
+        if instid is None and 'ids' in request.args:
+            return self._make_conditional(self._get_many(), True)
         if instid is None:
-            return self._search()
-        inst = self._get_by(instid)
+            response = self._search()
+            # the format of the response depends on the Accept header
+            response.vary.add('Accept')
+            return self._make_conditional(response, True)
+        query = self._query_by_primary_key(instid)
+        validators = self._validators(query)
+        if validators is not None:
+            response = self._not_modified(validators)
+            if response is not None:
+                return response
+        # if the instance is already in the session, it is not loaded again
+        query = self._with_loader_options(self.query())
+        inst = self._get_by(instid, query=query)
         if inst is None:
             abort(404)
-        # create a placeholder for the relations of the returned models
-        relations = frozenset(_get_relations(self.model))
-        # do not follow relations that will not be included in the response
-        if self.include_columns is not None:
-            cols = frozenset(self.include_columns)
-            rels = frozenset(self.include_relations)
-            relations &= (cols | rels)
-        elif self.exclude_columns is not None:
-            relations -= frozenset(self.exclude_columns)
-        deep = dict((r, {}) for r in relations)
-        result = _to_dict(inst, deep, exclude=self.exclude_columns,
-                          exclude_relations=self.exclude_relations,
-                          include=self.include_columns,
-                          include_relations=self.include_relations)
-        return jsonify(result)
+        response = self.jsonify(self.serialize(inst))
+        if validators is not None:
+            self._set_validators(response, validators)
+        return self._make_conditional(response)
+
+    def _delete_many(self):
+        """Removes each instance of the model which matches the search in the
+        ``q`` query parameter of the request, and responds with the number of
+        instances deleted.
+
+        If possible (see :meth:`_can_delete_in_bulk`), the instances are
+        deleted by a single ``DELETE`` statement; otherwise, they are loaded
+        and deleted one at a time, so that SQLAlchemy can cascade the
+        deletion to related instances.
+
+        If the search has no filters, this method responds with
+        :http:statuscode:`400` and deletes nothing, so that a missing or empty
+        ``q`` parameter never deletes every instance of the model.
+
+        """
+        try:
+            data = json.loads(request.args.get('q', '{}'))
+            search_params = SearchParameters.from_dictionary(data)
+        except (TypeError, ValueError, OverflowError, AttributeError,
+                KeyError):
+            message = 'Unable to decode data'
+            return self.jsonify_status_code(400, message=message)
+        if not search_params.filters:
+            message = 'Search must have at least one filter'
+            return self.jsonify_status_code(400, message=message)
+        # a DELETE statement cannot be limited, so the order of the instances
+        # only matters when the search specifies which ones to delete by their
+        # position
+        bulk = (search_params.limit is None and search_params.offset is None
+                and search_params.after is None
+                and search_params.before is None and
+                self._can_delete_in_bulk())
+        if bulk:
+            search_params.order_by = []
+        try:
+            query = create_query(self.session, self.model, search_params)
+        except:
+            message = 'Unable to construct query'
+            return self.jsonify_status_code(400, message=message)
+        if bulk:
+            # the session is expired on commit, so there is no need to remove
+            # the deleted instances from the session, unless the changes are
+            # only flushed (see _commit)
+            if _BATCH_TRANSACTION_KEY in request.environ:
+                synchronize = 'fetch'
+            else:
+                synchronize = False
+            num_deleted = query.delete(synchronize_session=synchronize)
+        else:
+            num_deleted = 0
+            for instance in query.all():
+                self.session.delete(instance)
+                num_deleted += 1
+        self._commit()
+        self._invalidate_cache()
+        return self.jsonify(num_deleted=num_deleted)
 
     def delete(self, instid):
         """Removes the specified instance of the model with the specified name
@@ -1008,13 +2628,120 @@ class API(ModelView):
         :rfc:`2616`, this method responds with :http:status:`204` regardless of
         whether an object was deleted.
 
+        If ``instid`` is ``None``, each instance of the model which matches the
+        search specified in the query string of the request is deleted
+        instead, and the response contains the number of deleted instances.
+        For more information, see :meth:`_delete_many`.
+
         """
         self._check_authentication()
+        if instid is None:
+            return self._delete_many()
         inst = self._get_by(instid)
         if inst is not None:
             self.session.delete(inst)
-            self.session.commit()
-        return jsonify_status_code(204)
+            self._commit()
+            self._invalidate_cache()
+        return self.jsonify_status_code(204)
+
+    def _instance_from_params(self, params):
+        """Returns a new instance of the model of this API, initialized with
+        the fields and related instances specified in `params`, a dictionary
+        whose keys have already been checked to be fields of the model.
+
+        The instance is not added to the session. Related instances are
+        retrieved or created as described in :meth:`post`.
+
+        Raises one of the exceptions specified in the `validation_exceptions`
+        keyword argument to the constructor of this class if the model
+        considers the instance invalid.
+
+        """
+        # If post_form_preprocessor is specified, call it
+        if self.post_form_preprocessor:
+            params = self.post_form_preprocessor(params)
+
+        # Getting the list of relations that will be added later
+        relations = self.fields.relations
+
+        # Looking for what we're going to set on the model right now
+        paramkeys = params.keys()
+        props = set(self.fields.attributes).intersection(paramkeys)
+        props = props.difference(relations)
+
+        # Special case: if there are any dates, convert the string form of the
+        # date into an instance of the Python ``datetime`` object.
+        params = self._strings_to_dates(params)
+
+        # Instantiate the model with the parameters.
+        modelargs = dict([(i, params[i]) for i in props])
+        # HACK Python 2.5 requires __init__() keywords to be strings.
+        instance = self.model(**unicode_keys_to_strings(modelargs))
+
+        # Handling relations, a single level is allowed
+        for col in set(relations).intersection(paramkeys):
+            submodel = self.fields.related_models[col]
+
+            if type(params[col]) == list:
+                # model has several related objects, all of which are
+                # retrieved by a single query
+                kws = [unicode_keys_to_strings(subparams)
+                       for subparams in params[col]]
+                subinsts = _get_or_create_all(self.session, submodel, kws)
+                getattr(instance, col).extend(subinsts)
+            else:
+                # model has single related object
+                kw = unicode_keys_to_strings(params[col])
+                subinst = _get_or_create(self.session, submodel, **kw)[0]
+                setattr(instance, col, subinst)
+        return instance
+
+    def _post_many(self, data):
+        """Creates an instance of the model for each of the JSON objects in
+        the list `data`, as described in :meth:`post`, and commits all of them
+        in a single transaction.
+
+        If any of the instances is invalid, none of them are created, and the
+        response contains a list with the validation errors of each instance
+        (or ``null`` for each valid one).
+
+        """
+        for params in data:
+            if not isinstance(params, dict):
+                message = 'Unable to decode data'
+                return self.jsonify_status_code(400, message=message)
+            for field in params:
+                if field not in self.fields:
+                    msg = "Model does not have field '%s'" % field
+                    return self.jsonify_status_code(400, message=msg)
+        instances = []
+        errors = []
+        for params in data:
+            try:
+                instances.append(self._instance_from_params(params))
+                errors.append(None)
+            except self.validation_exceptions, exception:
+                errors.append(self._extract_error_messages(exception) or
+                              'Could not determine specific validation errors')
+        if len(instances) < len(data):
+            self.session.rollback()
+            return self.jsonify_status_code(400, validation_errors=errors)
+        try:
+            if self.custom_save_method:
+                for instance in instances:
+                    getattr(instance, self.custom_save_method)()
+            else:
+                # the instances are inserted in a single flush, so instances
+                # of the same model are inserted together
+                self.session.add_all(instances)
+                self._commit()
+        except self.validation_exceptions, exception:
+            return self._handle_validation_exception(exception)
+        self._invalidate_cache()
+        pk_name = str(_primary_key_name(self.model))
+        objects = [{pk_name: getattr(instance, pk_name)}
+                   for instance in instances]
+        return self.jsonify_status_code(201, objects=objects)
 
     def post(self):
         """Creates a new instance of a given model based on request data.
@@ -1035,58 +2762,30 @@ class API(ModelView):
         Currently, this method can only handle instantiating a model with a
         single level of relationship data.
 
+        If the request data is a JSON list of objects, an instance is created
+        for each of them, and all of them are committed together, or not at
+        all if any of them is invalid. For more information, see
+        :ref:`bulkpost`.
+
         """
         self._check_authentication()
         # try to read the parameters for the model from the body of the request
         try:
             params = json.loads(request.data)
         except (TypeError, ValueError, OverflowError):
-            return jsonify_status_code(400, message='Unable to decode data')
+            return self.jsonify_status_code(400,
+                                            message='Unable to decode data')
+        if isinstance(params, list):
+            return self._post_many(params)
         # Check for any request parameter naming a column which does not exist
         # on the current model.
         for field in params:
-            if not hasattr(self.model, field):
+            if field not in self.fields:
                 msg = "Model does not have field '%s'" % field
-                return jsonify_status_code(400, message=msg)
-        # If post_form_preprocessor is specified, call it
-        if self.post_form_preprocessor:
-            params = self.post_form_preprocessor(params)
-
-        # Getting the list of relations that will be added later
-        cols = _get_columns(self.model)
-        relations = _get_relations(self.model)
-
-        # Looking for what we're going to set on the model right now
-        colkeys = cols.keys()
-        paramkeys = params.keys()
-        props = set(colkeys).intersection(paramkeys).difference(relations)
-
-        # Special case: if there are any dates, convert the string form of the
-        # date into an instance of the Python ``datetime`` object.
-        params = self._strings_to_dates(params)
+                return self.jsonify_status_code(400, message=msg)
 
         try:
-            # Instantiate the model with the parameters.
-            modelargs = dict([(i, params[i]) for i in props])
-            # HACK Python 2.5 requires __init__() keywords to be strings.
-            instance = self.model(**unicode_keys_to_strings(modelargs))
-
-            # Handling relations, a single level is allowed
-            for col in set(relations).intersection(paramkeys):
-                submodel = cols[col].property.mapper.class_
-
-                if type(params[col]) == list:
-                    # model has several related objects
-                    for subparams in params[col]:
-                        kw = unicode_keys_to_strings(subparams)
-                        subinst = _get_or_create(self.session, submodel,
-                                                 **kw)[0]
-                        getattr(instance, col).append(subinst)
-                else:
-                    # model has single related object
-                    kw = unicode_keys_to_strings(params[col])
-                    subinst = _get_or_create(self.session, submodel, **kw)[0]
-                    setattr(instance, col, subinst)
+            instance = self._instance_from_params(params)
 
             # add the created model to the session
 
@@ -1094,11 +2793,12 @@ class API(ModelView):
                 getattr(instance, self.custom_save_method)()
             else:
                 self.session.add(instance)
-                self.session.commit()
+                self._commit()
+            self._invalidate_cache()
 
             pk_name = str(_primary_key_name(instance))
             pk_value = getattr(instance, pk_name)
-            return jsonify_status_code(201, **{pk_name: pk_value})
+            return self.jsonify_status_code(201, **{pk_name: pk_value})
         except self.validation_exceptions, exception:
             return self._handle_validation_exception(exception)
 
@@ -1124,13 +2824,14 @@ class API(ModelView):
             data = json.loads(request.data)
         except (TypeError, ValueError, OverflowError):
             # this also happens when request.data is empty
-            return jsonify_status_code(400, message='Unable to decode data')
+            return self.jsonify_status_code(400,
+                                            message='Unable to decode data')
         # Check for any request parameter naming a column which does not exist
         # on the current model.
         for field in data:
-            if not hasattr(self.model, field):
+            if field not in self.fields:
                 msg = "Model does not have field '%s'" % field
-                return jsonify_status_code(400, message=msg)
+                return self.jsonify_status_code(400, message=msg)
         # Check if the request is to patch many instances of the current model.
         patchmany = instid is None
         if patchmany:
@@ -1138,8 +2839,8 @@ class API(ModelView):
                 # create a SQLALchemy Query from the query parameter `q`
                 query = create_query(self.session, self.model, data)
             except:
-                return jsonify_status_code(400,
-                                           message='Unable to construct query')
+                message = 'Unable to construct query'
+                return self.jsonify_status_code(400, message=message)
         else:
             # create a SQLAlchemy Query which has exactly the specified row
             query = self._query_by_primary_key(instid)
@@ -1156,20 +2857,282 @@ class API(ModelView):
         try:
             # Let's update all instances present in the query
             num_modified = 0
-            if params:
+            if params and patchmany and not relations and \
+                    self._can_update_in_bulk(params):
+                # the names of the columns may differ from the names of the
+                # attributes to which they are mapped
+                values = dict((getattr(self.model, field), value)
+                              for field, value in params.iteritems())
+                # the session is expired on commit, so there is no need to
+                # update the instances in the session, unless the changes are
+                # only flushed (see _commit)
+                if _BATCH_TRANSACTION_KEY in request.environ:
+                    synchronize = 'fetch'
+                else:
+                    synchronize = False
+                num_modified = query.update(values,
+                                            synchronize_session=synchronize)
+            elif params:
                 for item in query.all():
                     for param, value in params.iteritems():
                         setattr(item, param, value)
                     num_modified += 1
-            self.session.commit()
+            self._commit()
+            self._invalidate_cache()
         except self.validation_exceptions, exception:
             return self._handle_validation_exception(exception)
 
         if patchmany:
-            return jsonify(num_modified=num_modified)
+            return self.jsonify(num_modified=num_modified)
         else:
             return self.get(instid)
 
     def put(self, instid):
         """Alias for :meth:`patch`."""
         return self.patch(instid)
+
+
+class BatchAPI(MethodView):
+    """Provides a :http:method:`post` endpoint which accepts a list of requests
+    on the other endpoints of the application, makes each of them in turn, and
+    responds with the list of their responses.
+
+    The requests are dispatched to the view functions of the application in
+    the current request context, instead of by making HTTP requests, so the
+    cost of each request is only the cost of the view function itself. For a
+    description of the request and response formats, see :ref:`batch`.
+
+    .. versionadded:: 0.9
+
+    """
+
+    def __init__(self, session, json_encoder=None, max_requests=None,
+                 cache=None, *args, **kw):
+        """Calls the constructor of the superclass.
+
+        `session` is the SQLAlchemy session in which the views to which
+        requests are dispatched make changes to the database. It is used to
+        make the requests of a batch inside a single transaction, if the
+        client requests it.
+
+        `json_encoder` specifies the function which serializes the data of the
+        response to JSON, as described in :func:`_json_dumps_function`.
+
+        `max_requests` is the maximum number of requests in a batch, or
+        ``None`` if there is no maximum.
+
+        `cache` is the :class:`~flask.ext.restless.cache.ResponseCache` in
+        which the views to which requests are dispatched store their
+        responses, or ``None`` if responses are not being cached.
+
+        """
+        super(BatchAPI, self).__init__(*args, **kw)
+        self.session = session
+        self.dumps = _json_dumps_function(json_encoder, compact=True)
+        self.max_requests = max_requests
+        self.cache = cache
+
+    def _response(self, status_code, responses, **kw):
+        """Returns a JSON response with the specified status code, whose body
+        contains `responses` (a list of JSON strings) along with the mappings
+        in `kw`.
+
+        The JSON representations of the responses to the requests of the batch
+        are copied directly into the body of the response, instead of being
+        decoded and then encoded again.
+
+        """
+        pairs = ['%s:%s' % (self.dumps(key), self.dumps(value))
+                 for key, value in sorted(kw.iteritems())]
+        pairs.append('"responses":[%s]' % ','.join(responses))
+        data = '{%s}' % ','.join(pairs)
+        return current_app.response_class(data, status=status_code,
+                                          mimetype='application/json')
+
+    def _subresponse(self, status, body, encoding=None):
+        """Returns the JSON representation of the response to a request of the
+        batch, with the specified status code and body.
+
+        `body` is the object to serialize as the body of the response. If
+        `encoding` is not ``None``, `body` is a string which encodes the bytes
+        of the body of the response, and `encoding` is the name of the
+        encoding (for example, ``'base64'``).
+
+        """
+        response = dict(status=status, body=body)
+        if encoding is not None:
+            response['encoding'] = encoding
+        return self.dumps(response)
+
+    def _environ(self, subrequest, transaction=None):
+        """Returns the WSGI environment of the request described by
+        `subrequest`, a dictionary as described in :ref:`batch`.
+
+        The request has the same headers as the current request, except for
+        the headers in :data:`_BATCH_EXCLUDED_HEADERS`, which do not apply to
+        the request; headers specified in `subrequest` replace them.
+
+        `transaction` is the set of models whose cached responses must be
+        invalidated when the current transaction ends, or ``None`` if the
+        request is not made inside a transaction.
+
+        """
+        headers = Headers([(name, value) for name, value in request.headers
+                           if name.lower() not in _BATCH_EXCLUDED_HEADERS])
+        for name, value in (subrequest.get('headers') or {}).iteritems():
+            headers[str(name)] = value
+        body = subrequest.get('body')
+        if body is None:
+            data = content_type = None
+        else:
+            data, content_type = json.dumps(body), 'application/json'
+        # headers are given separately; the rest of the environment, for
+        # example the address of the client, is the same as that of the
+        # current request
+        base = dict((key, value) for key, value in request.environ.iteritems()
+                    if not key.startswith('HTTP_'))
+        method = subrequest.get('method', 'GET').upper()
+        builder = EnvironBuilder(path=subrequest['path'],
+                                 base_url=request.url_root, method=method,
+                                 headers=headers, data=data,
+                                 content_type=content_type,
+                                 environ_base=base)
+        try:
+            environ = builder.get_environ()
+        finally:
+            builder.close()
+        if transaction is not None:
+            environ[_BATCH_TRANSACTION_KEY] = transaction
+        return environ
+
+    def _dispatch(self, environ):
+        """Dispatches the request with the specified WSGI environment to the
+        view function which handles it, and returns a pair whose left element
+        is the status code of the response and whose right element is the
+        JSON representation of the response, as returned by
+        :meth:`_subresponse`.
+
+        The request temporarily replaces the current request in the current
+        request context. As for any other request, the functions registered
+        with :meth:`flask.Flask.before_request` (and those of the blueprint
+        which handles the request) are called first, and may make the response
+        instead of the view function, for example, if they check that the
+        client is authorized to make the request; the functions registered
+        with :meth:`flask.Flask.after_request` are called on the response. The
+        teardown functions are called only once, at the end of the batch
+        request.
+
+        """
+        app = current_app._get_current_object()
+        ctx = _request_ctx_stack.top
+        saved = ctx.request, ctx.url_adapter
+        endpoint = request.endpoint
+        ctx.request = app.request_class(environ)
+        ctx.url_adapter = app.create_url_adapter(ctx.request)
+        try:
+            ctx.match_request()
+            if ctx.request.url_rule is not None and \
+                    ctx.request.url_rule.endpoint == endpoint:
+                message = 'Batch requests cannot contain batch requests'
+                return 400, self._subresponse(400, dict(message=message))
+            try:
+                try:
+                    # this is what Flask.full_dispatch_request does
+                    response = app.preprocess_request()
+                    if response is None:
+                        response = app.dispatch_request()
+                except Exception, exception:
+                    # re-raises the exception if there is no error handler
+                    response = app.handle_user_exception(exception)
+                response = app.process_response(app.make_response(response))
+            except Exception:
+                if app.propagate_exceptions:
+                    raise
+                app.log_exception(sys.exc_info())
+                self.session.rollback()
+                message = 'Unable to complete request'
+                return 500, self._subresponse(500, dict(message=message))
+            status = response.status_code
+            data = response.data
+            if not data:
+                return status, self._subresponse(status, None)
+            if response.mimetype == 'application/json':
+                return status, '{"status":%d,"body":%s}' % (status, data)
+            try:
+                text = data.decode(response.charset)
+            except (UnicodeError, LookupError):
+                body = base64.b64encode(data)
+                return status, self._subresponse(status, body, 'base64')
+            return status, self._subresponse(status, text)
+        finally:
+            ctx.request, ctx.url_adapter = saved
+
+    def post(self):
+        """Makes each of the requests in the body of the request, and responds
+        with the list of their responses.
+
+        If the body of the request has a ``transaction`` mapping whose value is
+        ``true``, the requests are made inside a single database transaction,
+        which is committed only if every request succeeds. The views only
+        flush the changes made by these requests, instead of committing them,
+        so their changes are visible to the later requests of the batch (a
+        custom save method which commits the session, however, commits the
+        transaction). The first request which
+        fails causes all the changes to be rolled back and the remaining
+        requests not to be made, and the server responds with
+        :http:statuscode:`400`.
+
+        """
+        try:
+            data = json.loads(request.data) or {}
+            subrequests = data['requests']
+            transaction = bool(data.get('transaction', False))
+            if not isinstance(subrequests, list):
+                raise ValueError
+            for subrequest in subrequests:
+                if not isinstance(subrequest.get('path'), basestring) or \
+                        not isinstance(subrequest.get('method', 'GET'),
+                                       basestring):
+                    raise ValueError
+        except (TypeError, ValueError, OverflowError, KeyError,
+                AttributeError):
+            return jsonify_status_code(400, message='Unable to decode data')
+        if self.max_requests is not None and \
+                len(subrequests) > self.max_requests:
+            message = 'At most %s requests are allowed' % self.max_requests
+            return jsonify_status_code(400, message=message)
+        if not transaction:
+            responses = []
+            for subrequest in subrequests:
+                status, response = self._dispatch(self._environ(subrequest))
+                responses.append(response)
+            return self._response(200, responses)
+        session = self.session
+        invalidated = set()
+        responses = []
+        failed = False
+        try:
+            # the views only flush the changes made by requests which are
+            # made inside a transaction (see API._commit)
+            for subrequest in subrequests:
+                environ = self._environ(subrequest, invalidated)
+                status, response = self._dispatch(environ)
+                responses.append(response)
+                if status >= 400:
+                    failed = True
+                    break
+            if failed:
+                session.rollback()
+            else:
+                session.commit()
+        except:
+            session.rollback()
+            raise
+        finally:
+            if self.cache is not None and invalidated:
+                self.cache.invalidate(invalidated)
+        if failed:
+            message = ('Request %s failed; no changes were made'
+                       % len(responses))
+            return self._response(400, responses, message=message)
+        return self._response(200, responses)
@@ -16,6 +16,7 @@ from sqlalchemy import Column
 from sqlalchemy import create_engine
 from sqlalchemy import Date
 from sqlalchemy import DateTime
+from sqlalchemy import event
 from sqlalchemy import Float
 from sqlalchemy import ForeignKey
 from sqlalchemy import Integer
@@ -131,6 +132,19 @@ class TestSupport(FlaskTestBase):
         # create all the tables required for the models
         self.Base.metadata.create_all()
 
+    def record_statements(self):
+        """Returns a list to which the SQL string of each statement executed
+        by the database engine from now on is appended.
+
+        """
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(self.Base.metadata.bind, 'before_cursor_execute', record)
+        return statements
+
     def tearDown(self):
         """Drops all tables from the temporary database."""
         #self.session.remove()
@@ -0,0 +1,191 @@
+"""
+    tests.test_cache
+    ~~~~~~~~~~~~~~~~
+
+    Provides unit tests for the :mod:`flask_restless.cache` module.
+
+    :copyright: 2012 Jeffrey Finkelstein <jeffrey.finkelstein@gmail.com>
+    :license: GNU AGPLv3+ or BSD
+
+"""
+from unittest2 import TestCase
+from unittest2 import TestSuite
+
+from flask import json
+from mock import patch
+from sqlalchemy import Column
+from sqlalchemy import Integer
+from sqlalchemy import Table
+from sqlalchemy import Unicode
+from sqlalchemy.orm import mapper
+
+from flask.ext.restless import APIManager
+from flask.ext.restless.cache import LRUCache
+
+from .helpers import TestSupport
+
+
+__all__ = ['LRUCacheTest', 'ResponseCacheTest']
+
+
+dumps = json.dumps
+loads = json.loads
+
+
+class LRUCacheTest(TestCase):
+    """Unit tests for the :class:`flask_restless.cache.LRUCache` class."""
+
+    def test_get_and_set(self):
+        """Tests that values which have been set can be retrieved."""
+        cache = LRUCache()
+        self.assertIsNone(cache.get('foo'))
+        cache.set('foo', 1)
+        self.assertEqual(cache.get('foo'), 1)
+        cache.set('foo', 2)
+        self.assertEqual(cache.get('foo'), 2)
+        cache.delete('foo')
+        self.assertIsNone(cache.get('foo'))
+
+    def test_timeout(self):
+        """Tests that values expire after their timeout."""
+        cache = LRUCache(default_timeout=10)
+        with patch('time.time', return_value=100):
+            cache.set('foo', 1)
+            cache.set('bar', 2, 20)
+            cache.set('baz', 3, 0)
+        with patch('time.time', return_value=115):
+            self.assertIsNone(cache.get('foo'))
+            self.assertEqual(cache.get('bar'), 2)
+        with patch('time.time', return_value=1000):
+            self.assertIsNone(cache.get('bar'))
+            self.assertEqual(cache.get('baz'), 3)
+
+    def test_least_recently_used(self):
+        """Tests that the least recently used values are discarded when the
+        cache is full.
+
+        """
+        cache = LRUCache(max_entries=4)
+        for i in range(4):
+            cache.set(i, i)
+        cache.get(0)
+        cache.set(4, 4)
+        # the cache is reduced to three quarters of its maximum size
+        self.assertEqual([cache.get(i) for i in range(5)],
+                         [0, None, None, 3, 4])
+
+
+class ResponseCacheTest(TestSupport):
+    """Tests for caching responses to :http:method:`get` requests."""
+
+    def setUp(self):
+        """Creates an :class:`flask_restless.APIManager` with a cache, and an
+        API for the ``Person`` and ``Computer`` models.
+
+        """
+        super(ResponseCacheTest, self).setUp()
+        self.manager = APIManager(self.flaskapp, session=self.session,
+                                  cache=LRUCache())
+        self.manager.create_api(self.Person, methods=['GET', 'POST', 'PATCH',
+                                                      'DELETE'])
+        self.manager.create_api(self.Computer, methods=['GET', 'PATCH'])
+        self.statements = self.record_statements()
+
+    def test_cached_responses(self):
+        """Tests that identical requests are answered from the cache."""
+        self.app.post('/api/person', data=dumps(dict(name=u'foo')))
+        response = self.app.get('/api/person/1')
+        self.assertEqual(response.status_code, 200)
+        del self.statements[:]
+        cached = self.app.get('/api/person/1')
+        self.assertEqual(self.statements, [])
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(cached.headers['ETag'], response.headers['ETag'])
+        headers = {'If-None-Match': response.headers['ETag']}
+        self.assertEqual(self.app.get('/api/person/1', headers=headers)
+                         .status_code, 304)
+
+        # search parameters are normalized
+        q1 = '{"filters": [{"name": "name", "op": "==", "val": "foo"}]}'
+        q2 = '{"filters":[{"val":"foo","op":"==","name":"name"}]}'
+        response = self.app.get('/api/person?q=%s' % q1)
+        self.assertEqual(len(loads(response.data)['objects']), 1)
+        del self.statements[:]
+        self.app.get('/api/person?q=%s' % q2)
+        self.assertEqual(self.statements, [])
+        self.app.get('/api/person?q=%s&page=2' % q2)
+        self.assertNotEqual(self.statements, [])
+
+        # errors are not cached
+        self.assertEqual(self.app.get('/api/person/2').status_code, 404)
+        self.app.post('/api/person', data=dumps(dict(name=u'bar')))
+        self.assertEqual(self.app.get('/api/person/2').status_code, 200)
+
+    def test_invalidation(self):
+        """Tests that cached responses are invalidated when the database is
+        changed through an API.
+
+        """
+        self.app.post('/api/person', data=dumps(dict(name=u'foo')))
+        computer = self.Computer(name=u'c1', owner_id=1)
+        self.session.add(computer)
+        self.session.commit()
+        self.assertEqual(len(loads(self.app.get('/api/person').data)
+                             ['objects']), 1)
+        self.app.post('/api/person', data=dumps(dict(name=u'bar')))
+        self.assertEqual(len(loads(self.app.get('/api/person').data)
+                             ['objects']), 2)
+
+        response = self.app.patch('/api/person/1',
+                                  data=dumps(dict(name=u'baz')))
+        self.assertEqual(loads(response.data)['name'], 'baz')
+        response = self.app.get('/api/person/1')
+        self.assertEqual(loads(response.data)['name'], 'baz')
+
+        # changes to related instances invalidate the response too
+        self.app.patch('/api/computer/1', data=dumps(dict(name=u'c2')))
+        response = self.app.get('/api/person/1')
+        self.assertEqual(loads(response.data)['computers'][0]['name'], 'c2')
+
+        self.app.delete('/api/person/2')
+        self.assertEqual(self.app.get('/api/person/2').status_code, 404)
+
+    def test_invalidation_by_table(self):
+        """Tests that cached responses are invalidated for models without a
+        ``__tablename__`` attribute and for models which share a table.
+
+        """
+        table = Table('vehicle', self.Base.metadata,
+                      Column('id', Integer, primary_key=True),
+                      Column('kind', Unicode),
+                      Column('name', Unicode))
+
+        class Vehicle(object):
+            def __init__(self, **kw):
+                for name, value in kw.iteritems():
+                    setattr(self, name, value)
+
+        class Car(Vehicle):
+            pass
+
+        mapper(Vehicle, table, polymorphic_on=table.c.kind,
+               polymorphic_identity=u'vehicle')
+        mapper(Car, inherits=Vehicle, polymorphic_identity=u'car')
+        table.create()
+        self.manager.create_api(Vehicle, collection_name='vehicle')
+        self.manager.create_api(Car, collection_name='car',
+                                methods=['GET', 'POST', 'PATCH'])
+        self.app.post('/api/car', data=dumps(dict(name=u'foo')))
+        response = self.app.get('/api/vehicle/1')
+        self.assertEqual(loads(response.data)['name'], 'foo')
+        self.app.patch('/api/car/1', data=dumps(dict(name=u'bar')))
+        response = self.app.get('/api/vehicle/1')
+        self.assertEqual(loads(response.data)['name'], 'bar')
+
+
+def load_tests(loader, standard_tests, pattern):
+    """Returns the test suite for this module."""
+    suite = TestSuite()
+    suite.addTest(loader.loadTestsFromTestCase(LRUCacheTest))
+    suite.addTest(loader.loadTestsFromTestCase(ResponseCacheTest))
+    return suite
@@ -11,10 +11,13 @@
 from unittest2 import TestCase
 from unittest2 import TestSuite
 
+from flask.ext.restless.helpers import field_index
 from flask.ext.restless.helpers import partition
 
+from .helpers import TestSupport
 
-__all__ = ['HelpersTest']
+
+__all__ = ['FieldIndexTest', 'HelpersTest']
 
 
 class HelpersTest(TestCase):
@@ -31,8 +34,43 @@ class HelpersTest(TestCase):
         self.assertEqual(list(range(5, 10)), right)
 
 
+class FieldIndexTest(TestSupport):
+    """Unit tests for the :class:`flask_restless.helpers.FieldIndex` class."""
+
+    def test_fields(self):
+        """Tests that the index describes the columns and relations of a
+        model.
+
+        """
+        fields = field_index(self.Person)
+        self.assertIs(field_index(self.Person), fields)
+        self.assertEqual(sorted(fields.columns), ['age', 'birth_date', 'id',
+                                                  'name', 'other'])
+        self.assertEqual(fields.date_fields, set(['birth_date']))
+        self.assertEqual(fields.relations, ['computers'])
+        self.assertIs(fields.related_models['computers'], self.Computer)
+        self.assertTrue(fields.uselist['computers'])
+        self.assertIs(fields.attribute('age'), self.Person.age)
+
+        fields = field_index(self.Computer)
+        self.assertEqual(fields.date_fields, set(['buy_date']))
+        self.assertIs(fields.related_models['owner'], self.Person)
+        self.assertFalse(fields.uselist['owner'])
+
+    def test_unknown_field(self):
+        """Tests that looking up a field which does not exist raises an
+        :exc:`AttributeError`.
+
+        """
+        fields = field_index(self.Person)
+        self.assertNotIn('bogus', fields)
+        self.assertIn('name', fields)
+        self.assertRaises(AttributeError, fields.attribute, 'bogus')
+
+
 def load_tests(loader, standard_tests, pattern):
     """Returns the test suite for this module."""
     suite = TestSuite()
+    suite.addTest(loader.loadTestsFromTestCase(FieldIndexTest))
     suite.addTest(loader.loadTestsFromTestCase(HelpersTest))
     return suite
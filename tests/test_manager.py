@@ -9,9 +9,11 @@
 
 """
 import datetime
+from decimal import Decimal
 from unittest2 import skipUnless
 from unittest2 import TestSuite
 import mock
+import uuid
 
 from flask import json
 try:
@@ -21,8 +23,17 @@ except:
 else:
     has_flask_sqlalchemy = True
 
+try:
+    import simplejson
+except ImportError:
+    has_simplejson = False
+else:
+    has_simplejson = True
+
 from flask.ext.restless import APIManager
+from flask.ext.restless.manager import IllegalArgumentError
 from flask.ext.restless.views import _get_columns
+from flask.ext.restless.views import _json_dumps_function
 
 from .helpers import FlaskTestBase
 from .helpers import TestSupport
@@ -433,6 +444,86 @@ class APIManagerTest(TestSupport):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(loads(response.data)['id'], 1)
 
+    def test_view_reused(self):
+        """Tests that the keyword arguments to
+        :meth:`flask_restless.manager.APIManager.create_api` are parsed when
+        the API is created, instead of on each request.
+
+        """
+        self.manager.create_api(self.Person, methods=['GET', 'POST'],
+                                exclude_columns=['age'])
+        with mock.patch('flask_restless.views.API.__init__') as init:
+            response = self.app.post('/api/person',
+                                     data=dumps(dict(name=u'foo', age=1)))
+            self.assertEqual(response.status_code, 201)
+            response = self.app.get('/api/person/1')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('age', loads(response.data))
+            self.assertFalse(init.called)
+
+    def test_json_encoder(self):
+        """Tests that responses are serialized by the JSON encoder specified in
+        the constructor.
+
+        """
+        with self.assertRaises(IllegalArgumentError):
+            APIManager(self.flaskapp, session=self.session,
+                       json_encoder='bogus')
+        encoded = []
+
+        def encoder(obj):
+            encoded.append(obj)
+            return dumps(obj)
+
+        manager = APIManager(self.flaskapp, session=self.session,
+                             json_encoder=encoder)
+        manager.create_api(self.Person, methods=['GET', 'POST'])
+        manager = APIManager(self.flaskapp, session=self.session,
+                             json_encoder='json')
+        manager.create_api(self.Person, url_prefix='/api2')
+        d = dict(name=u'foo', birth_date='1999-12-31')
+        response = self.app.post('/api/person', data=dumps(d))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(encoded, [dict(id=1)])
+        response = self.app.get('/api/person/1')
+        self.assertEqual(loads(response.data)['birth_date'], '1999-12-31')
+        # dates are converted before calling a function provided by the user
+        self.assertEqual(encoded[1]['birth_date'], '1999-12-31')
+
+        response = self.app.get('/api2/person/1')
+        self.assertEqual(loads(response.data)['birth_date'], '1999-12-31')
+
+        # the built-in encoders handle other common types
+        d = dict(a=datetime.datetime(1999, 12, 31, 1, 2, 3),
+                 b=Decimal('1.5'), c=uuid.UUID(int=1))
+        self.assertEqual(loads(_json_dumps_function('json')(d)),
+                         dict(a='1999-12-31T01:02:03', b='1.5',
+                              c='00000000-0000-0000-0000-000000000001'))
+        # the json module does not convert decimal numbers to floating point
+        # numbers
+        d = dict(b=Decimal('0.10000000000000000001'))
+        self.assertEqual(_json_dumps_function('json')(d),
+                         '{"b": "0.10000000000000000001"}')
+        if has_simplejson:
+            self.assertEqual(_json_dumps_function('simplejson')(d),
+                             '{"b": 0.10000000000000000001}')
+        # by default, decimal numbers are serialized by flask.json
+        if json.__name__ == 'simplejson':
+            expected = '{"b": 0.10000000000000000001}'
+        else:
+            expected = '{"b": "0.10000000000000000001"}'
+        self.assertEqual(_json_dumps_function()(d), expected)
+        # indented JSON has no trailing whitespace
+        for encoder in None, 'json':
+            lines = _json_dumps_function(encoder)(dict(a=[1, 2]), indent=2)
+            self.assertNotIn(' \n', lines)
+
+        # only libraries which can serialize these types are recognized
+        for name in 'ujson', 'orjson':
+            with self.assertRaises(IllegalArgumentError):
+                APIManager(self.flaskapp, session=self.session,
+                           json_encoder=name)
+
 
 class FSATest(FlaskTestBase):
     """Tests which use models defined using Flask-SQLAlchemy instead of pure
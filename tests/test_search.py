@@ -12,10 +12,15 @@ from __future__ import with_statement
 
 from unittest2 import TestSuite
 
+from mock import patch
 from sqlalchemy.orm.exc import MultipleResultsFound
 from sqlalchemy.orm.exc import NoResultFound
 
 from flask.ext.restless.search import create_query
+from flask.ext.restless.search import OPERATORS
+from flask.ext.restless.search import OrderBy
+from flask.ext.restless.search import QueryBuilder
+from flask.ext.restless.search import register_operator
 from flask.ext.restless.search import search
 from flask.ext.restless.search import SearchParameters
 
@@ -96,6 +101,55 @@ class QueryCreationTest(TestSupportPrefilled):
         self.assertEqual(results[1].other, 19)
 
 
+    def test_keyset(self):
+        """Tests that the ``after`` and ``before`` search parameters restrict
+        the search to instances on one side of a position in the ordering.
+
+        """
+        order_by = [OrderBy('other'), OrderBy('id', 'desc')]
+        s = SearchParameters(order_by=order_by, after=[10, 4])
+        query = create_query(self.session, self.Person, s)
+        self.assertEqual([p.name for p in query],
+                         ['Mary', 'Lucy', 'Lincoln'])
+        # searches before a keyset are returned in the reverse order
+        s = SearchParameters(order_by=order_by, before=[20, 3], limit=2)
+        query = create_query(self.session, self.Person, s)
+        self.assertEqual([p.name for p in query], ['Mary', 'Katy'])
+
+    def test_cached_filters(self):
+        """Tests that the expressions for filters are reused by searches whose
+        filters differ only in their values.
+
+        """
+        create_filters = QueryBuilder._create_filters
+        with patch.object(QueryBuilder, '_create_filters',
+                          wraps=create_filters) as mock:
+            d = {'filters': [{'name': 'age', 'val': 19, 'op': '>='},
+                             {'name': 'name', 'val': [u'Mary', u'Lucy'],
+                              'op': 'in'}],
+                 'order_by': [{'field': 'age'}]}
+            query = create_query(self.session, self.Person, d)
+            self.assertEqual([p.name for p in query], ['Mary', 'Lucy'])
+            d['filters'][0]['val'] = 24
+            query = create_query(self.session, self.Person, d)
+            self.assertEqual([p.name for p in query], ['Lucy'])
+            d['filters'][0]['val'] = 19
+            d['filters'][1]['val'] = [u'Lincoln', u'Mary']
+            query = create_query(self.session, self.Person, d)
+            self.assertEqual([p.name for p in query], ['Mary', 'Lincoln'])
+            self.assertEqual(mock.call_count, 1)
+
+            # a different shape creates new expressions
+            d['filters'][1]['val'] = [u'Lincoln', u'Mary', u'Lucy']
+            query = create_query(self.session, self.Person, d)
+            self.assertEqual([p.name for p in query],
+                             ['Mary', 'Lincoln', 'Lucy'])
+            d['filters'][0]['val'] = 24.5
+            query = create_query(self.session, self.Person, d)
+            self.assertEqual([p.name for p in query], ['Lucy'])
+            self.assertEqual(mock.call_count, 3)
+
+
 class OperatorsTest(TestSupportPrefilled):
     """Tests for each of the query operators defined in
     :data:`flask_restless.search.OPERATORS`.
@@ -188,6 +242,52 @@ class OperatorsTest(TestSupportPrefilled):
         result = search(self.session, self.Computer, d)
         self.assertEqual(len(result), 3)
 
+    def test_register_operator(self):
+        """Tests that operators can be added using the
+        :func:`flask_restless.search.register_operator` function.
+
+        """
+        self.assertRaises(ValueError, register_operator, 'bogus',
+                          lambda: None)
+        self.assertNotIn('bogus', OPERATORS)
+        register_operator('startswith', lambda f, a: f.startswith(a))
+        try:
+            self.assertEqual(OPERATORS['startswith'].numargs, 2)
+            d = dict(filters=[dict(name='name', op='startswith', val=u'L')])
+            result = search(self.session, self.Person, d)
+            self.assertEqual(set(p.name for p in result),
+                             set([u'Lincoln', u'Lucy']))
+            # replacing an operator affects later searches with that operator
+            register_operator('startswith', lambda f, a: f.endswith(a))
+            d = dict(filters=[dict(name='name', op='startswith', val=u'y')])
+            result = search(self.session, self.Person, d)
+            self.assertEqual(set(p.name for p in result),
+                             set([u'Mary', u'Lucy', u'Katy']))
+        finally:
+            del OPERATORS['startswith']
+
+    def test_assign_operator(self):
+        """Tests that operators assigned directly in
+        :data:`flask_restless.search.OPERATORS` affect later searches, even if
+        a search with the same filters has already been made.
+
+        """
+        d = dict(filters=[dict(name='name', op='like', val=u'L%')])
+        result = search(self.session, self.Person, d)
+        self.assertEqual(set(p.name for p in result),
+                         set([u'Lincoln', u'Lucy']))
+        original = OPERATORS['like']
+        OPERATORS['like'] = lambda f, a: ~f.like(a)
+        try:
+            result = search(self.session, self.Person, d)
+            self.assertEqual(set(p.name for p in result),
+                             set([u'Mary', u'Katy', u'John']))
+        finally:
+            OPERATORS['like'] = original
+        result = search(self.session, self.Person, d)
+        self.assertEqual(set(p.name for p in result),
+                         set([u'Lincoln', u'Lucy']))
+
 
 class SearchTest(TestSupportPrefilled):
     """Unit tests for the :func:`flask_restless.search.search` function.
@@ -111,6 +111,16 @@ class SimpleValidationTest(TestSupport):
         self.assertIn('email', errors)
         self.assertIn('format', errors['email'].lower())
 
+        # posting many people reports the errors of each one
+        people = [dict(name='John', email='foo@example.com', age=1),
+                  dict(name='Jeffrey', email='bogus!!!email', age=1)]
+        response = self.app.post('/api/test', data=dumps(people))
+        self.assertEqual(response.status_code, 400)
+        errors = loads(response.data)['validation_errors']
+        self.assertEqual(len(errors), 2)
+        self.assertIsNone(errors[0])
+        self.assertIn('email', errors[1])
+
         # posting a new person with valid email format should be fine
         person = dict(name='John', email='foo@example.com', age=1)
         response = self.app.post('/api/test', data=dumps(person))
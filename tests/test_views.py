@@ -16,13 +16,21 @@ from datetime import datetime
 from unittest2 import TestSuite
 from unittest2 import skipUnless
 
+from flask import abort
 from flask import json
+from flask import request
+from flask import Response
+from mock import patch
 try:
     from flask.ext.sqlalchemy import SQLAlchemy
 except:
     has_flask_sqlalchemy = False
 else:
     has_flask_sqlalchemy = True
+from sqlalchemy import Column
+from sqlalchemy import event
+from sqlalchemy import Integer
+from sqlalchemy import Unicode
 from sqlalchemy.exc import OperationalError
 
 from flask.ext.restless.manager import APIManager
@@ -30,7 +38,9 @@ from flask.ext.restless.manager import IllegalArgumentError
 from flask.ext.restless.views import _evaluate_functions as evaluate_functions
 from flask.ext.restless.views import _get_columns
 from flask.ext.restless.views import _get_or_create
+from flask.ext.restless.views import _get_or_create_all
 from flask.ext.restless.views import _get_relations
+from flask.ext.restless.views import _Serializer
 from flask.ext.restless.views import _to_dict
 
 from .helpers import FlaskTestBase
@@ -39,7 +49,7 @@ from .helpers import TestSupportPrefilled
 
 
 __all__ = ['ModelTestCase', 'FunctionEvaluationTest', 'FunctionAPITestCase',
-           'APITestCase', 'FSAModelTest']
+           'APITestCase', 'BatchAPITestCase', 'FSAModelTest']
 
 
 dumps = json.dumps
@@ -212,6 +222,32 @@ class ModelTestCase(TestSupport):
         self.assertEqual(me_dict['age'], 24)
         self.assertEqual(me_dict['birth_date'], me.birth_date.isoformat())
 
+    def test_serializer(self):
+        """Tests that a :class:`flask_restless.views._Serializer` creates the
+        same dictionary as :func:`flask_restless.views._to_dict`, regardless
+        of whether the attributes of an instance have been loaded.
+
+        """
+        person = self.Person(name=u'Lincoln', age=24,
+                             birth_date=date(1986, 9, 15))
+        person.computers.append(self.Computer(name=u'lixeiro'))
+        self.session.add(person)
+        self.session.commit()
+        serializer = _Serializer(self.Person, deep={'computers': []},
+                                 include=['name', 'birth_date'])
+        # all attributes are expired after the commit
+        person_dict = serializer(person)
+        self.assertEqual(person_dict, _to_dict(person, {'computers': []},
+                                               include=['name', 'birth_date']))
+        self.assertEqual(sorted(person_dict), ['birth_date', 'computers',
+                                               'name'])
+        self.assertEqual(person_dict['birth_date'], '1986-09-15')
+        self.assertEqual(person_dict['computers'][0]['name'], u'lixeiro')
+        # now all attributes are loaded
+        self.assertEqual(serializer(person), person_dict)
+        with self.assertRaises(ValueError):
+            _Serializer(self.Person, include=['name'], exclude=['age'])
+
     def test_to_dict_dynamic_relation(self):
         """Tests that a dynamically queried relation is resolved when getting
         the dictionary representation of an instance of a model.
@@ -272,6 +308,33 @@ class ModelTestCase(TestSupport):
         self.assertEqual(second_instance.name, u'Lincoln')
         self.assertEqual(second_instance.age, 24)
 
+    def test_get_or_create_all(self):
+        """Test for getting or creating many instances at once, in which the
+        existing instances are matched by the database.
+
+        """
+        self.session.add(self.Person(name=u'Lincoln', age=24))
+        self.session.commit()
+        dictionaries = [dict(age='24'), dict(age=25), dict(age=24),
+                        dict(age=25)]
+        instances = _get_or_create_all(self.session, self.Person,
+                                       dictionaries)
+        # the string is converted to an integer by the database
+        self.assertEqual(instances[0].name, u'Lincoln')
+        self.assertIs(instances[0], instances[2])
+        self.assertIs(instances[1], instances[3])
+        self.assertIsNone(instances[1].name)
+        self.assertEqual(self.session.query(self.Person).count(), 2)
+
+        # the number of dictionaries in each query depends on their size
+        self.session.commit()
+        statements = self.record_statements()
+        dictionaries = [dict(name=u'%d' % i, age=i) for i in range(5)]
+        with patch('flask_restless.views._FIND_BATCH_SIZE', 4):
+            _get_or_create_all(self.session, self.Person, dictionaries)
+        self.assertEqual(len([statement for statement in statements
+                              if statement.startswith('SELECT')]), 3)
+
 
 class FunctionEvaluationTest(TestSupportPrefilled):
     """Unit tests for the :func:`flask_restless.view._evaluate_functions`
@@ -323,6 +386,52 @@ class FunctionEvaluationTest(TestSupportPrefilled):
         with self.assertRaises(OperationalError):
             evaluate_functions(self.session, self.Person, functions)
 
+    def test_group_by(self):
+        """Tests for evaluating functions on groups of instances."""
+        functions = [{'name': 'sum', 'field': 'age'}]
+        result = evaluate_functions(self.session, self.Person, functions,
+                                    group_by=['other'])
+        self.assertEqual(sorted((row['other'], row['sum__age'])
+                                for row in result),
+                         [(10, 35), (19, 19), (20, 25), (22, 23)])
+
+        having = [{'name': 'sum__age', 'op': '>', 'val': 20}]
+        order_by = [{'field': 'sum__age', 'direction': 'desc'}]
+        result = evaluate_functions(self.session, self.Person, functions,
+                                    group_by=['other'], having=having,
+                                    order_by=order_by, limit=2)
+        self.assertEqual(result, [{'other': 10, 'sum__age': 35},
+                                  {'other': 20, 'sum__age': 25}])
+
+        with self.assertRaises(AttributeError):
+            evaluate_functions(self.session, self.Person, functions,
+                               group_by=['bogus'])
+        with self.assertRaises(AttributeError):
+            evaluate_functions(self.session, self.Person, functions,
+                               group_by=['other'], order_by=[{'field': 'age'}])
+
+    def test_filters(self):
+        """Tests for evaluating functions only on the instances which meet
+        the filters of a search.
+
+        """
+        functions = [{'name': 'sum', 'field': 'age'},
+                     {'name': 'count', 'field': 'id'}]
+        filters = [{'name': 'age', 'op': '>', 'val': 20}]
+        result = evaluate_functions(self.session, self.Person, functions,
+                                    filters=filters)
+        self.assertEqual(result, {'sum__age': 76, 'count__id': 3})
+        filters = [{'name': 'age', 'op': '>', 'val': 20},
+                   {'name': 'other', 'op': '==', 'val': 10}]
+        result = evaluate_functions(self.session, self.Person, functions,
+                                    group_by=['other'], filters=filters)
+        self.assertEqual(result, [{'other': 10, 'sum__age': 28,
+                                   'count__id': 1}])
+        with self.assertRaises(AttributeError):
+            evaluate_functions(self.session, self.Person, functions,
+                               filters=[{'name': 'bogus', 'op': '==',
+                                         'val': 1}])
+
 
 class FunctionAPITestCase(TestSupportPrefilled):
     """Unit tests for the :class:`flask_restless.views.FunctionAPI` class."""
@@ -391,6 +500,95 @@ class FunctionAPITestCase(TestSupportPrefilled):
         self.assertIn('message', loads(resp.data))
         self.assertIn('bogusfuncname', loads(resp.data)['message'])
 
+    def test_grouped_function_evaluation(self):
+        """Tests that the :http:get:`/api/eval/computer` endpoint evaluates
+        functions on groups of instances, including groups given by fields of
+        related instances.
+
+        """
+        self.manager.create_api(self.Computer, allow_functions=True)
+        for person in self.session.query(self.Person):
+            for i in range(len(person.name)):
+                computer = self.Computer(name=u'%s%d' % (person.name, i),
+                                         vendor=u'Apple', owner=person)
+                self.session.add(computer)
+        self.session.commit()
+        functions = [{'name': 'count', 'field': 'id'}]
+        order_by = [{'field': 'owner__name'}]
+        query = dumps(dict(functions=functions, group_by=['owner__name'],
+                           having=[{'name': 'count__id', 'op': '<',
+                                    'val': 5}],
+                           order_by=order_by))
+        response = self.app.get('/api/eval/computer?q=%s' % query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.data)['objects'],
+                         [{'owner__name': 'John', 'count__id': 4},
+                          {'owner__name': 'Katy', 'count__id': 4},
+                          {'owner__name': 'Lucy', 'count__id': 4},
+                          {'owner__name': 'Mary', 'count__id': 4}])
+
+        query = dumps(dict(functions=functions, group_by=['owner__bogus']))
+        response = self.app.get('/api/eval/computer?q=%s' % query)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('owner__bogus', loads(response.data)['message'])
+        query = dumps(dict(functions=functions, group_by=['vendor'],
+                           having=[{'name': 'vendor', 'op': 'bogus'}]))
+        response = self.app.get('/api/eval/computer?q=%s' % query)
+        self.assertEqual(response.status_code, 400)
+        query = dumps(dict(functions=functions, group_by=['vendor'],
+                           order_by=[{'field': 'vendor',
+                                      'direction': 'bogus'}]))
+        response = self.app.get('/api/eval/computer?q=%s' % query)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(loads(response.data)['message'],
+                         'Unable to construct query')
+
+        # malformed filters on the groups
+        for having in (['x'], 'x', [{'name': 'count__id', 'op': '>'}],
+                       [{'name': 'count__id'}]):
+            query = dumps(dict(functions=functions, group_by=['vendor'],
+                               having=having))
+            response = self.app.get('/api/eval/computer?q=%s' % query)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(loads(response.data)['message'],
+                             'Unable to construct query')
+        query = dumps(dict(functions=functions, group_by=['vendor'],
+                           having=[{'name': 'count__id', 'op': 'is_null'}]))
+        response = self.app.get('/api/eval/computer?q=%s' % query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.data)['objects'], [])
+
+    def test_filtered_function_evaluation(self):
+        """Tests that the :http:get:`/api/eval/person` endpoint evaluates
+        functions only on the instances which meet the specified filters.
+
+        """
+        functions = [{'name': 'avg', 'field': 'age'}]
+        filters = [{'name': 'name', 'op': 'like', 'val': 'L%'}]
+        query = dumps(dict(functions=functions, filters=filters))
+        response = self.app.get('/api/eval/person?q=%s' % query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.data), {'avg__age': 24})
+
+        filters = [{'name': 'bogus', 'op': '==', 'val': 1}]
+        query = dumps(dict(functions=functions, filters=filters))
+        response = self.app.get('/api/eval/person?q=%s' % query)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bogus', loads(response.data)['message'])
+        filters = [{'name': 'age', 'op': 'bogus', 'val': 1}]
+        query = dumps(dict(functions=functions, filters=filters))
+        response = self.app.get('/api/eval/person?q=%s' % query)
+        self.assertEqual(response.status_code, 400)
+
+        # malformed filters
+        for filters in (['x'], 'x', [{'name': 'age', 'op': '>'}],
+                        [{'op': '=='}]):
+            query = dumps(dict(functions=functions, filters=filters))
+            response = self.app.get('/api/eval/person?q=%s' % query)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(loads(response.data)['message'],
+                             'Unable to construct query')
+
 
 class APITestCase(TestSupport):
     """Unit tests for the :class:`flask_restless.views.API` class."""
@@ -443,6 +641,32 @@ class APITestCase(TestSupport):
         inst = _to_dict(person, deep)
         self.assertEqual(loads(response.data), inst)
 
+    def test_post_many(self):
+        """Tests for creating many instances of the database model using a
+        single :http:method:`post` request.
+
+        """
+        data = [dict(name=u'Lincoln', age=23),
+                dict(name=u'Mary', age=19, birth_date='1993-01-02'),
+                dict(name=u'Lucy', computers=[dict(name=u'turing')])]
+        response = self.app.post('/api/person', data=dumps(data))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(loads(response.data)['objects'],
+                         [dict(id=1), dict(id=2), dict(id=3)])
+        people = self.session.query(self.Person).order_by('id').all()
+        self.assertEqual([p.name for p in people], ['Lincoln', 'Mary', 'Lucy'])
+        self.assertEqual(people[1].birth_date.year, 1993)
+        self.assertEqual(people[2].computers[0].name, 'turing')
+
+        # no instances are created if any of the objects is bad
+        data = [dict(name=u'Jeffrey'), dict(name=u'John', bogus=0)]
+        response = self.app.post('/api/person', data=dumps(data))
+        self.assertEqual(response.status_code, 400)
+        data = [dict(name=u'Jeffrey'), 1]
+        response = self.app.post('/api/person', data=dumps(data))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.session.query(self.Person).count(), 3)
+
     def test_post_bad_parameter(self):
         """Tests that attempting to make a :http:method:`post` request with a
         form parameter which does not exist on the specified model responds
@@ -473,6 +697,31 @@ class APITestCase(TestSupport):
         response = self.app.get('/api/person')
         self.assertEqual(len(loads(response.data)['objects']), 1)
         
+    def test_post_with_many_submodels(self):
+        """Tests that the existing instances of a list of related instances
+        are retrieved by a single query, and that all of the instances are
+        committed once.
+
+        """
+        self.session.add(self.Computer(name=u'c1', vendor=u'Apple'))
+        self.session.commit()
+        statements = self.record_statements()
+        commits = []
+        event.listen(self.Base.metadata.bind, 'commit', commits.append)
+        computers = [dict(name=u'c%d' % i) for i in range(1, 6)]
+        computers.append(dict(name=u'c2'))
+        data = dict(name=u'John', computers=computers)
+        response = self.app.post('/api/person', data=dumps(data))
+        self.assertEqual(response.status_code, 201)
+        selects = [statement for statement in statements
+                   if 'FROM computer' in statement]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(self.session.query(self.Computer).count(), 5)
+        person = self.session.query(self.Person).one()
+        self.assertEqual(sorted(c.name for c in person.computers),
+                         [u'c1', u'c2', u'c3', u'c4', u'c5'])
+
     def test_post_with_single_submodel(self):
         data = {'vendor': u'Apple',  'name': u'iMac',
                 'owner': {'name': u'John', 'age': 2041}}
@@ -483,6 +732,62 @@ class APITestCase(TestSupport):
         response = self.app.get('/api/person')
         self.assertEqual(len(loads(response.data)['objects']), 1)
 
+    def test_get_many(self):
+        """Tests for getting each instance whose primary key is listed in the
+        ``ids`` query parameter using a single query.
+
+        """
+        for name in u'Lincoln', u'Lucy', u'Mary':
+            self.session.add(self.Person(name=name))
+        self.session.commit()
+        self.session.expunge_all()
+        statements = self.record_statements()
+        response = self.app.get('/api/person?ids=3,7,1')
+        self.assertEqual(response.status_code, 200)
+        data = loads(response.data)
+        self.assertEqual([person['name'] for person in data['objects']],
+                         [u'Mary', u'Lincoln'])
+        self.assertEqual(data['missing'], [7])
+        # one query for the people and one for their computers
+        self.assertEqual(len(statements), 2)
+
+        response = self.app.get('/api/person?ids=')
+        self.assertEqual(loads(response.data),
+                         dict(objects=[], missing=[]))
+        response = self.app.get('/api/person?ids=1,bogus')
+        self.assertEqual(response.status_code, 400)
+
+        # the primary keys are looked up in batches
+        self.session.expunge_all()
+        del statements[:]
+        ids = ','.join(str(i) for i in range(1, 6))
+        with patch('flask_restless.views._FIND_BATCH_SIZE', 2):
+            response = self.app.get('/api/person?ids=%s' % ids)
+        data = loads(response.data)
+        self.assertEqual([person['name'] for person in data['objects']],
+                         [u'Lincoln', u'Lucy', u'Mary'])
+        self.assertEqual(data['missing'], [4, 5])
+        self.assertEqual(len([statement for statement in statements
+                              if statement.startswith('SELECT person')]), 3)
+
+    def test_get_from_session(self):
+        """Tests that an instance which is already present in the session is
+        not loaded from the database again when it is requested by its primary
+        key.
+
+        """
+        person = self.Person(name=u'Lincoln')
+        self.session.add(person)
+        self.session.commit()
+        # load the instance into the session
+        self.assertEqual(person.name, u'Lincoln')
+        statements = self.record_statements()
+        response = self.app.get('/api/person/1')
+        self.assertEqual(loads(response.data)['name'], u'Lincoln')
+        self.assertFalse(any('FROM person' in statement
+                             for statement in statements))
+        self.assertEqual(self.app.get('/api/person/2').status_code, 404)
+
     def test_delete(self):
         """Test for deleting an instance of the database using the
         :http:method:`delete` method.
@@ -520,6 +825,59 @@ class APITestCase(TestSupport):
         response = self.app.delete('/api/person/1')
         self.assertEqual(response.status_code, 204)
 
+    def test_delete_many(self):
+        """Tests for deleting each instance of the model which matches a
+        search using the :http:method:`delete` method.
+
+        """
+        self.manager.create_api(self.Person, methods=['DELETE'],
+                                allow_delete_many=True, url_prefix='/api/v2')
+        self.manager.create_api(self.Computer, methods=['DELETE'],
+                                allow_delete_many=True, url_prefix='/api/v2')
+        lincoln = self.Person(name=u'Lincoln', age=23)
+        mary = self.Person(name=u'Mary', age=19)
+        lucy = self.Person(name=u'Lucy', age=25)
+        lincoln.computers = [self.Computer(name=u'c1', vendor=u'Apple'),
+                             self.Computer(name=u'c2', vendor=u'Dell')]
+        mary.computers = [self.Computer(name=u'c3', vendor=u'Apple')]
+        self.session.add_all((lincoln, mary, lucy))
+        self.session.commit()
+        self.assertEqual(self.app.delete('/api/person').status_code, 405)
+
+        # a search without filters does not delete every instance
+        response = self.app.delete('/api/v2/computer')
+        self.assertEqual(response.status_code, 400)
+        q = dumps(dict(filters=[], order_by=[dict(field='name')]))
+        response = self.app.delete('/api/v2/computer?q=%s' % q)
+        self.assertEqual(response.status_code, 400)
+
+        # computers are deleted by a single statement
+        statements = self.record_statements()
+        q = dumps(dict(filters=[dict(name='vendor', op='==', val='Apple')],
+                       order_by=[dict(field='name')]))
+        response = self.app.delete('/api/v2/computer?q=%s' % q)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.data)['num_deleted'], 2)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('DELETE FROM computer'))
+        self.assertEqual(self.session.query(self.Computer).count(), 1)
+
+        # people are loaded, so their computers can be disassociated
+        q = dumps(dict(filters=[dict(name='age', op='>', val=20)]))
+        response = self.app.delete('/api/v2/person?q=%s' % q)
+        self.assertEqual(loads(response.data)['num_deleted'], 2)
+        self.assertEqual(self.session.query(self.Person).one().name, 'Mary')
+        self.assertIsNone(self.session.query(self.Computer).one().owner_id)
+
+        response = self.app.delete('/api/v2/person?q=bogus')
+        self.assertEqual(response.status_code, 400)
+
+        # a filter which every instance matches deletes all of them
+        q = dumps(dict(filters=[dict(name='id', op='is_not_null')]))
+        response = self.app.delete('/api/v2/computer?q=%s' % q)
+        self.assertEqual(loads(response.data)['num_deleted'], 1)
+        self.assertEqual(self.session.query(self.Computer).count(), 0)
+
     def test_disallow_patch_many(self):
         """Tests that disallowing "patch many" requests responds with a
         :http:statuscode:`405`.
@@ -624,6 +982,50 @@ class APITestCase(TestSupport):
             self.assertEqual(i['birth_date'], ('%s-%s-%s' % (
                     year, str(month).zfill(2), str(day).zfill(2))))
 
+    def test_patch_many_single_statement(self):
+        """Tests that updating a collection of instances using the
+        :http:method:`patch` method issues a single ``UPDATE`` statement
+        instead of loading each instance.
+
+        """
+        self.manager.create_api(self.Person, methods=['PATCH'],
+                                allow_patch_many=True, url_prefix='/api/v2')
+        for name in u'Lincoln', u'Lucy', u'Mary':
+            self.session.add(self.Person(name=name, age=23))
+        self.session.commit()
+        statements = self.record_statements()
+        response = self.app.patch('/api/v2/person', data=dumps(dict(age=24)))
+        self.assertEqual(loads(response.data)['num_modified'], 3)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('UPDATE person'))
+        self.session.expire_all()
+        ages = [person.age for person in self.session.query(self.Person)]
+        self.assertEqual(ages, [24, 24, 24])
+
+    def test_patch_many_renamed_column(self):
+        """Tests that updating a collection of instances using the
+        :http:method:`patch` method in a single ``UPDATE`` statement sets a
+        column whose name differs from the name of its attribute.
+
+        """
+        class Thing(self.Base):
+            __tablename__ = 'thing'
+            id = Column(Integer, primary_key=True)
+            foo = Column('bar', Unicode)
+        Thing.metadata.create_all()
+        self.session.add_all([Thing(foo=u'a'), Thing(foo=u'b')])
+        self.session.commit()
+        self.manager.create_api(Thing, methods=['PATCH'],
+                                allow_patch_many=True)
+        statements = self.record_statements()
+        response = self.app.patch('/api/thing', data=dumps(dict(foo=u'c')))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.data)['num_modified'], 2)
+        self.assertEqual(len(statements), 1)
+        self.session.expire_all()
+        self.assertEqual([thing.foo for thing in self.session.query(Thing)],
+                         [u'c', u'c'])
+
     def test_single_update(self):
         """Test for updating a single instance of the model using the
         :http:method:`patch` method.
@@ -782,6 +1184,30 @@ class APITestCase(TestSupport):
         resp = self.app.get('/api/computer/1')
         self.assertEqual(resp.status_code, 404)
 
+    def test_patch_add_submodel_string_id(self):
+        """Tests that an existing instance can be added as a related item
+        when its primary key is given as a string.
+
+        """
+        resp = self.app.post('/api/person',
+                             data=dumps({'name': u'Lincoln', 'age': 23}))
+        self.assertEqual(resp.status_code, 201)
+        comp_data = {'name': u'lixeiro', 'vendor': u'Lemote'}
+        resp = self.app.post('/api/computer', data=dumps(comp_data))
+        self.assertEqual(resp.status_code, 201)
+
+        update_data = {'computers': {'add': [{'id': '1'}]}}
+        resp = self.app.patch('/api/person/1', data=dumps(update_data))
+        self.assertEqual(resp.status_code, 200)
+
+        resp = self.app.get('/api/person/1')
+        self.assertEqual(resp.status_code, 200)
+        loaded = loads(resp.data)
+        self.assertEqual(len(loaded['computers']), 1)
+        self.assertEqual(loaded['computers'][0]['id'], 1)
+        self.assertEqual(loaded['computers'][0]['name'], u'lixeiro')
+        self.assertEqual(self.session.query(self.Computer).count(), 1)
+
     def test_search(self):
         """Tests basic search using the :http:method:`get` method."""
         # Trying to pass invalid params to the search method
@@ -1047,6 +1473,481 @@ class APITestCase(TestSupport):
         self.assertEqual(len(loads(response.data)['objects']), 25)
         self.assertEqual(loads(response.data)['total_pages'], 1)
 
+    def test_pagination_limit_offset(self):
+        """Tests that pagination, which is performed by the database, respects
+        the ``limit`` and ``offset`` search parameters.
+
+        """
+        for i in range(25):
+            d = dict(name=unicode('person%s' % i))
+            response = self.app.post('/api/person', data=dumps(d))
+            self.assertEqual(response.status_code, 201)
+        search = dict(limit=15, offset=3)
+        response = self.app.search('/api/person', dumps(search))
+        self.assertEqual(response.status_code, 200)
+        data = loads(response.data)
+        self.assertEqual(data['num_results'], 15)
+        self.assertEqual(data['total_pages'], 2)
+        self.assertEqual(len(data['objects']), 10)
+        self.assertEqual(data['objects'][0]['name'], 'person3')
+        response = self.app.get('/api/person?page=2&q=%s' % dumps(search))
+        self.assertEqual(response.status_code, 200)
+        data = loads(response.data)
+        self.assertEqual(len(data['objects']), 5)
+        self.assertEqual(data['objects'][0]['name'], 'person13')
+        self.assertEqual(data['objects'][-1]['name'], 'person17')
+        response = self.app.get('/api/person?page=3&q=%s' % dumps(search))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.data)['objects'], [])
+
+    def test_keyset_pagination(self):
+        """Tests for pagination using cursors instead of page numbers."""
+        self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                keyset_pagination=True)
+        for i in range(25):
+            d = dict(name=unicode('person%s' % i), age=i % 5)
+            response = self.app.post('/api/person', data=dumps(d))
+            self.assertEqual(response.status_code, 201)
+        search = dict(order_by=[dict(field='age', direction='desc')])
+        url = '/api/v2/person?q=%s' % dumps(search)
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = loads(response.data)
+        self.assertEqual(data['num_results'], 25)
+        self.assertEqual(data['total_pages'], 3)
+        self.assertIsNone(data['prev'])
+        pages = [data['objects']]
+        while data['next'] is not None:
+            response = self.app.get(url + '&cursor=%s' % data['next'])
+            self.assertEqual(response.status_code, 200)
+            data = loads(response.data)
+            pages.append(data['objects'])
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        people = sum(pages, [])
+        # the ordering is by age, descending, then by primary key, ascending
+        expected = sorted(people, key=lambda p: (-p['age'], p['id']))
+        self.assertEqual(people, expected)
+        self.assertEqual(len(set(p['id'] for p in people)), 25)
+        # go back to the previous page
+        response = self.app.get(url + '&cursor=%s' % data['prev'])
+        self.assertEqual(response.status_code, 200)
+        data = loads(response.data)
+        self.assertEqual(data['objects'], pages[1])
+        self.assertIsNotNone(data['next'])
+        response = self.app.get(url + '&cursor=%s' % data['prev'])
+        data = loads(response.data)
+        self.assertEqual(data['objects'], pages[0])
+        self.assertIsNone(data['prev'])
+        # bad cursors
+        response = self.app.get(url + '&cursor=bogus')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(loads(response.data)['message'],
+                         'Unable to decode cursor')
+
+    def test_keyset_pagination_nulls(self):
+        """Tests that pagination using cursors reaches every instance when the
+        field by which the search is ordered has ``NULL`` values.
+
+        """
+        self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                keyset_pagination=True, results_per_page=2)
+        ages = [None, 1, None, 2, None, 1, None]
+        for i, age in enumerate(ages):
+            d = dict(name=unicode('person%s' % i), age=age)
+            response = self.app.post('/api/person', data=dumps(d))
+            self.assertEqual(response.status_code, 201)
+        for direction in 'asc', 'desc':
+            search = dict(order_by=[dict(field='age', direction=direction)])
+            url = '/api/v2/person?q=%s' % dumps(search)
+            data = loads(self.app.get(url).data)
+            pages = [data['objects']]
+            while data['next'] is not None:
+                response = self.app.get(url + '&cursor=%s' % data['next'])
+                self.assertEqual(response.status_code, 200)
+                data = loads(response.data)
+                pages.append(data['objects'])
+            self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+            people = sum(pages, [])
+            self.assertEqual(sorted(p['id'] for p in people), range(1, 8))
+            # SQLite sorts NULL values before all other values
+            expected = sorted(people, key=lambda p: (p['age'], p['id']))
+            if direction == 'desc':
+                expected = sorted(people, key=lambda p: p['id'])
+                expected.sort(key=lambda p: p['age'], reverse=True)
+            self.assertEqual(people, expected)
+            # go back through the previous pages
+            for page in reversed(pages[:-1]):
+                response = self.app.get(url + '&cursor=%s' % data['prev'])
+                self.assertEqual(response.status_code, 200)
+                data = loads(response.data)
+                self.assertEqual(data['objects'], page)
+            self.assertIsNone(data['prev'])
+
+    def test_count_mode(self):
+        """Tests that the total number of results can be estimated or skipped
+        instead of counted exactly.
+
+        """
+        with self.assertRaises(IllegalArgumentError):
+            self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                    count_mode='bogus')
+        self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                count_mode='skipped')
+        self.manager.create_api(self.Person, url_prefix='/api/v3',
+                                count_mode='estimated')
+        self.manager.create_api(self.Person, url_prefix='/api/v4',
+                                count_mode='skipped', keyset_pagination=True)
+        for i in range(15):
+            d = dict(name=unicode('person%s' % i))
+            response = self.app.post('/api/person', data=dumps(d))
+            self.assertEqual(response.status_code, 201)
+
+        response = self.app.get('/api/person')
+        data = loads(response.data)
+        self.assertEqual(data['count_mode'], 'exact')
+        self.assertEqual(data['num_results'], 15)
+
+        response = self.app.get('/api/v2/person')
+        data = loads(response.data)
+        self.assertEqual(data['count_mode'], 'skipped')
+        self.assertNotIn('num_results', data)
+        self.assertNotIn('total_pages', data)
+        self.assertTrue(data['has_more'])
+        self.assertEqual(len(data['objects']), 10)
+        response = self.app.get('/api/v2/person?page=2')
+        data = loads(response.data)
+        self.assertFalse(data['has_more'])
+        self.assertEqual(len(data['objects']), 5)
+        search = dict(limit=12)
+        response = self.app.get('/api/v2/person?page=2&q=%s' % dumps(search))
+        data = loads(response.data)
+        self.assertFalse(data['has_more'])
+        self.assertEqual(len(data['objects']), 2)
+
+        # SQLite provides no estimate, so the results are counted exactly
+        response = self.app.get('/api/v3/person')
+        data = loads(response.data)
+        self.assertEqual(data['count_mode'], 'exact')
+        self.assertEqual(data['num_results'], 15)
+
+        response = self.app.get('/api/v4/person')
+        data = loads(response.data)
+        self.assertEqual(data['count_mode'], 'skipped')
+        self.assertNotIn('num_results', data)
+        self.assertIsNotNone(data['next'])
+
+    def test_eager_loading(self):
+        """Tests that related instances are loaded in a fixed number of
+        queries, regardless of the number of instances on a page.
+
+        """
+        for i in range(5):
+            person = self.Person(name=unicode('person%s' % i))
+            for j in range(3):
+                name = unicode('computer%s-%s' % (i, j))
+                person.computers.append(self.Computer(name=name))
+            self.session.add(person)
+        self.session.commit()
+        self.session.expunge_all()
+        statements = self.record_statements()
+        response = self.app.get('/api/person')
+        self.assertEqual(response.status_code, 200)
+        data = loads(response.data)
+        self.assertEqual(len(data['objects']), 5)
+        self.assertEqual(len(data['objects'][4]['computers']), 3)
+        # one query for the count, one for the page, one for the computers
+        self.assertEqual(len(statements), 3)
+        # the page is ordered, so that the computers are loaded for the
+        # people on the page
+        self.assertIn('ORDER BY person.id', statements[1])
+
+        del statements[:]
+        self.session.expunge_all()
+        response = self.app.get('/api/computer')
+        self.assertEqual(response.status_code, 200)
+        data = loads(response.data)
+        self.assertEqual(data['objects'][0]['owner']['name'], 'person0')
+        # the owners are loaded by a join on the query for the page
+        self.assertEqual(len(statements), 2)
+
+        del statements[:]
+        self.session.expunge_all()
+        response = self.app.get('/api/person/1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(loads(response.data)['computers']), 3)
+        self.assertEqual(len(statements), 2)
+
+    def test_stream_results(self):
+        """Tests that an unpaginated response can be streamed to the client in
+        batches of instances.
+
+        """
+        self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                results_per_page=0)
+        self.manager.create_api(self.Person, url_prefix='/api/v3',
+                                results_per_page=0, stream_results=True)
+        self.manager.create_api(self.Person, url_prefix='/api/v4',
+                                results_per_page=0, stream_results=True,
+                                compact_json=True)
+        for i in range(7):
+            person = self.Person(name=unicode('person%s' % i))
+            person.computers.append(self.Computer(name=unicode('c%s' % i)))
+            self.session.add(person)
+        self.session.commit()
+        expected = loads(self.app.get('/api/v2/person').data)
+        for batch_size in 1, 3, 7, 10:
+            with patch('flask_restless.views._STREAM_BATCH_SIZE', batch_size):
+                response = self.app.get('/api/v3/person')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'application/json')
+            self.assertEqual(loads(response.data), expected)
+        search = dict(filters=[dict(name='name', op='==', val='bogus')])
+        response = self.app.get('/api/v3/person?q=%s' % dumps(search))
+        data = loads(response.data)
+        self.assertEqual(data['objects'], [])
+        self.assertEqual(data['num_results'], 0)
+        # the streamed response is compact if requested
+        response = self.app.get('/api/v4/person')
+        self.assertNotIn(' ', response.data)
+        self.assertEqual(loads(response.data), expected)
+
+    def test_search_formats(self):
+        """Tests that the results of a search are provided as newline
+        delimited JSON or as comma-separated values if the client prefers
+        those formats.
+
+        """
+        self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                results_per_page=0,
+                                include_columns=['name', 'birth_date'])
+        for i in range(12):
+            d = dict(name=unicode('person%s' % i))
+            if i == 0:
+                d['birth_date'] = '1999-12-31'
+            response = self.app.post('/api/person', data=dumps(d))
+            self.assertEqual(response.status_code, 201)
+
+        response = self.app.get('/api/person', headers={'Accept': '*/*'})
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(len(loads(response.data)['objects']), 10)
+        self.assertIn('Accept', response.headers['Vary'])
+
+        headers = {'Accept': 'application/x-ndjson'}
+        response = self.app.get('/api/person?page=2', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.data.splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(loads(lines[0])['name'], 'person10')
+        search = dict(filters=[dict(name='name', op='like', val='person1%')])
+        response = self.app.get('/api/v2/person?q=%s' % dumps(search),
+                                headers=headers)
+        people = [loads(line) for line in response.data.splitlines()]
+        self.assertEqual([p['name'] for p in people],
+                         ['person1', 'person10', 'person11'])
+
+        headers = {'Accept': 'text/csv, application/json;q=0.5'}
+        response = self.app.get('/api/v2/person', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        rows = response.data.splitlines()
+        self.assertEqual(len(rows), 13)
+        self.assertEqual(rows[0], 'name,birth_date')
+        self.assertEqual(rows[1], 'person0,1999-12-31')
+        self.assertEqual(rows[2], 'person1,')
+
+    def test_compact_json(self):
+        """Tests that responses can be made smaller by omitting whitespace and
+        fields whose value is ``None``.
+
+        """
+        self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                compact_json=True, omit_nulls=True)
+        manager = APIManager(self.flaskapp, session=self.session,
+                             compact_json=True)
+        manager.create_api(self.Person, url_prefix='/api/v3')
+        manager.create_api(self.Person, url_prefix='/api/v4',
+                           compact_json=False)
+        response = self.app.post('/api/person', data=dumps(dict(name=u'foo')))
+        self.assertEqual(response.status_code, 201)
+
+        response = self.app.get('/api/v2/person/1')
+        self.assertNotIn(' ', response.data)
+        self.assertEqual(loads(response.data),
+                         dict(id=1, name='foo', computers=[]))
+        response = self.app.get('/api/v2/person')
+        self.assertNotIn(' ', response.data)
+        data = loads(response.data)
+        self.assertEqual(data['objects'],
+                         [dict(id=1, name='foo', computers=[])])
+
+        response = self.app.get('/api/v3/person/1')
+        self.assertNotIn(' ', response.data)
+        self.assertIsNone(loads(response.data)['age'])
+        response = self.app.get('/api/v4/person/1')
+        self.assertIn('\n', response.data)
+
+    def test_conditional_get(self):
+        """Tests that unchanged resources are reported with
+        :http:statuscode:`304` responses to conditional requests.
+
+        """
+        with self.assertRaises(IllegalArgumentError):
+            self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                    version_column='bogus')
+        # use the `age` column as a version number, for the sake of testing
+        self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                version_column='age',
+                                methods=['GET', 'PATCH'])
+        self.manager.create_api(self.Computer, url_prefix='/api/v2',
+                                last_modified_column='buy_date')
+        d = dict(name=u'foo', age=1)
+        response = self.app.post('/api/person', data=dumps(d))
+        self.assertEqual(response.status_code, 201)
+
+        # the entity tag is a hash of the response data
+        response = self.app.get('/api/person/1')
+        etag = response.headers['ETag']
+        headers = {'If-None-Match': etag}
+        response = self.app.get('/api/person/1', headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, '')
+        response = self.app.get('/api/person', headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        # the entity tag is computed from the version column
+        response = self.app.get('/api/v2/person/1')
+        etag = response.headers['ETag']
+        headers = {'If-None-Match': etag}
+        response = self.app.get('/api/v2/person/1', headers=headers)
+        self.assertEqual(response.status_code, 304)
+        response = self.app.patch('/api/v2/person/1',
+                                  data=dumps(dict(age=2)))
+        response = self.app.get('/api/v2/person/1', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.data)['age'], 2)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        response = self.app.get('/api/v2/person')
+        headers = {'If-None-Match': response.headers['ETag']}
+        response = self.app.get('/api/v2/person', headers=headers)
+        self.assertEqual(response.status_code, 304)
+        response = self.app.post('/api/person', data=dumps(dict(name=u'bar')))
+        response = self.app.get('/api/v2/person', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.data)['num_results'], 2)
+
+        # the date of last modification is computed from a date column
+        computer = self.Computer(name=u'c', buy_date=datetime(2012, 1, 2))
+        self.session.add(computer)
+        self.session.commit()
+        response = self.app.get('/api/v2/computer/1')
+        self.assertEqual(response.headers['Last-Modified'],
+                         'Mon, 02 Jan 2012 00:00:00 GMT')
+        headers = {'If-Modified-Since': 'Mon, 02 Jan 2012 00:00:00 GMT'}
+        response = self.app.get('/api/v2/computer/1', headers=headers)
+        self.assertEqual(response.status_code, 304)
+        # removing an instance from a collection does not change the latest
+        # modification date, so it is sent but not compared
+        response = self.app.get('/api/v2/computer', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Last-Modified'],
+                         'Mon, 02 Jan 2012 00:00:00 GMT')
+        headers = {'If-Modified-Since': 'Sun, 01 Jan 2012 00:00:00 GMT'}
+        response = self.app.get('/api/v2/computer/1', headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_replaced_instance(self):
+        """Tests that the entity tag of a collection computed from the version
+        column changes when an instance is replaced by another one with the
+        same version.
+
+        """
+        # use the `other` column as a version number, for the sake of testing
+        self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                version_column='other',
+                                methods=['GET', 'POST', 'DELETE'])
+        for name in u'Lincoln', u'Mary':
+            self.session.add(self.Person(name=name, other=10))
+        self.session.commit()
+        response = self.app.get('/api/v2/person')
+        headers = {'If-None-Match': response.headers['ETag']}
+        response = self.app.get('/api/v2/person', headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.app.delete('/api/v2/person/1')
+        self.app.post('/api/v2/person',
+                      data=dumps(dict(name=u'Lucy', other=10)))
+        response = self.app.get('/api/v2/person', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        names = [person['name'] for person in loads(response.data)['objects']]
+        self.assertEqual(names, [u'Mary', u'Lucy'])
+
+    def test_conditional_get_page(self):
+        """Tests that the entity tag of a page of a collection computed from
+        the version column depends only on the instances on that page and on
+        the total number of instances.
+
+        """
+        # use the `other` column as a version number, for the sake of testing
+        self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                version_column='other', results_per_page=2,
+                                methods=['GET', 'PATCH'])
+        for i in range(5):
+            self.session.add(self.Person(name=unicode(i), other=1))
+        self.session.commit()
+        response = self.app.get('/api/v2/person?page=1')
+        headers = {'If-None-Match': response.headers['ETag']}
+        # only the instances on the page are read from the database
+        self.session.commit()
+        statements = self.record_statements()
+        response = self.app.get('/api/v2/person?page=1', headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertTrue(any('LIMIT' in statement for statement in statements))
+        # an update on another page does not change this page
+        self.app.patch('/api/v2/person/5', data=dumps(dict(other=2)))
+        response = self.app.get('/api/v2/person?page=1', headers=headers)
+        self.assertEqual(response.status_code, 304)
+        # an update on this page does
+        self.app.patch('/api/v2/person/2', data=dumps(dict(other=2)))
+        response = self.app.get('/api/v2/person?page=1', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        # so does a change in the total number of instances
+        headers = {'If-None-Match': response.headers['ETag']}
+        self.session.add(self.Person(name=u'foo', other=1))
+        self.session.commit()
+        response = self.app.get('/api/v2/person?page=1', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.data)['num_results'], 6)
+
+    def test_deferred_columns(self):
+        """Tests that columns which are not included in the response are not
+        loaded from the database.
+
+        """
+        includes = ['name', 'computers', 'computers.vendor']
+        self.manager.create_api(self.Person, url_prefix='/api/v2',
+                                include_columns=includes)
+        person = self.Person(name=u'Lincoln', age=23)
+        person.computers.append(self.Computer(name=u'c1', vendor=u'Apple'))
+        self.session.add(person)
+        self.session.commit()
+        self.session.expunge_all()
+        statements = self.record_statements()
+        response = self.app.get('/api/v2/person')
+        self.assertEqual(response.status_code, 200)
+        data = loads(response.data)
+        expected = dict(name='Lincoln', computers=[dict(vendor='Apple')])
+        self.assertEqual(data['objects'], [expected])
+        page, computers = statements[1:]
+        self.assertIn('person.name', page)
+        self.assertIn('person.id', page)
+        self.assertNotIn('person.age', page)
+        self.assertNotIn('person.birth_date', page)
+        self.assertIn('computer.vendor', computers)
+        # the foreign key is needed to match computers with their owners
+        self.assertIn('computer.owner_id', computers)
+        self.assertNotIn('computer.name', computers)
+        self.assertNotIn('computer.buy_date', computers)
+
     def test_num_results(self):
         """Tests that a request for (a subset of) all instances of a model
         includes the total number of results as part of the JSON response.
@@ -1080,6 +1981,27 @@ class APITestCase(TestSupport):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(loads(response.data), dict(name='Earth'))
 
+    def test_composite_primary_key(self):
+        """Tests that an instance of a model with a composite primary key can
+        be retrieved and deleted by the ``id`` part of its primary key.
+
+        """
+        class Moon(self.Base):
+            __tablename__ = 'moon'
+            id = Column(Integer, primary_key=True)
+            name = Column(Unicode, primary_key=True)
+        Moon.metadata.create_all()
+        self.session.add(Moon(id=1, name=u'Luna'))
+        self.session.commit()
+        self.manager.create_api(Moon, methods=['GET', 'DELETE'])
+        response = self.app.get('/api/moon/1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(response.data), dict(id=1, name=u'Luna'))
+        self.assertEqual(self.app.get('/api/moon/2').status_code, 404)
+        response = self.app.delete('/api/moon/1')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.session.query(Moon).count(), 0)
+
     def test_post_form_preprocessor(self):
         """Tests POST method decoration using a custom function."""
         def decorator_function(params):
@@ -1101,6 +2023,177 @@ class APITestCase(TestSupport):
         self.assertEquals(person.other, 7)
 
 
+class BatchAPITestCase(TestSupportPrefilled):
+    """Unit tests for the :class:`flask_restless.views.BatchAPI` class."""
+
+    def setUp(self):
+        """Creates the ReSTful API endpoints for the :class:`testapp.Person`
+        and :class:`testapp.Computer` models, and the batch endpoint.
+
+        """
+        super(BatchAPITestCase, self).setUp()
+        self.manager.create_api(self.Person, methods=['GET', 'POST', 'PATCH'],
+                                allow_functions=True)
+        self.manager.create_api(self.Computer)
+        self.manager.create_batch_api(max_requests=5)
+
+    def test_request_hooks(self):
+        """Tests that the functions registered to run before and after each
+        request are run for each request in a batch, and that a function run
+        before a request can prevent the request from being made.
+
+        """
+        paths = []
+
+        @self.flaskapp.before_request
+        def forbid_computers():
+            if request.path.startswith('/api/computer'):
+                abort(403)
+
+        @self.flaskapp.after_request
+        def record_path(response):
+            paths.append(request.path)
+            return response
+
+        requests = [dict(path='/api/person/1'), dict(path='/api/computer/1')]
+        response = self.app.post('/api/batch',
+                                 data=dumps(dict(requests=requests)))
+        self.assertEqual(response.status_code, 200)
+        responses = loads(response.data)['responses']
+        self.assertEqual([r['status'] for r in responses], [200, 403])
+        self.assertEqual(paths,
+                         ['/api/person/1', '/api/computer/1', '/api/batch'])
+
+    def test_batch(self):
+        """Tests that the requests in a batch are made in order, and their
+        responses returned together.
+
+        """
+        q = dumps(dict(filters=[dict(name='age', op='lt', val=20)]))
+        requests = [dict(path='/api/person/1'),
+                    dict(method='post', path='/api/person',
+                         body=dict(name=u'Jeffrey', age=24)),
+                    dict(path='/api/person?q=%s' % q),
+                    dict(path='/api/computer/1'),
+                    dict(path='/api/bogus')]
+        response = self.app.post('/api/batch',
+                                 data=dumps(dict(requests=requests)))
+        self.assertEqual(response.status_code, 200)
+        responses = loads(response.data)['responses']
+        self.assertEqual([r['status'] for r in responses],
+                         [200, 201, 200, 404, 404])
+        self.assertEqual(responses[0]['body']['name'], 'Lincoln')
+        self.assertEqual(responses[1]['body']['id'], 6)
+        self.assertEqual(responses[2]['body']['num_results'], 2)
+        self.assertEqual(self.session.query(self.Person).count(), 6)
+
+        # batches cannot be nested or exceed the maximum size
+        requests = [dict(method='POST', path='/api/batch', body=[])]
+        response = self.app.post('/api/batch',
+                                 data=dumps(dict(requests=requests)))
+        self.assertEqual(loads(response.data)['responses'][0]['status'], 400)
+        requests = [dict(path='/api/person/1')] * 6
+        response = self.app.post('/api/batch',
+                                 data=dumps(dict(requests=requests)))
+        self.assertEqual(response.status_code, 400)
+        response = self.app.post('/api/batch', data=dumps(dict(requests=1)))
+        self.assertEqual(response.status_code, 400)
+
+    def test_binary_response(self):
+        """Tests that the body of a response which is not text is encoded in
+        base 64 in the response to a batch.
+
+        """
+        @self.flaskapp.route('/binary')
+        def binary():
+            return Response('\xff\x00', mimetype='application/octet-stream')
+
+        requests = [dict(path='/binary'), dict(path='/api/person/1')]
+        response = self.app.post('/api/batch',
+                                 data=dumps(dict(requests=requests)))
+        self.assertEqual(response.status_code, 200)
+        responses = loads(response.data)['responses']
+        self.assertEqual(responses[0], dict(status=200, body='/wA=',
+                                            encoding='base64'))
+        self.assertEqual(responses[1]['body']['name'], 'Lincoln')
+
+    def test_transaction(self):
+        """Tests that the requests in a transactional batch are committed
+        only if all of them succeed.
+
+        """
+        requests = [dict(method='PATCH', path='/api/person/1',
+                         body=dict(age=24)),
+                    dict(path='/api/person/1'),
+                    dict(method='POST', path='/api/person',
+                         body=dict(name=u'Jeffrey', bogus=1))]
+        response = self.app.post('/api/batch',
+                                 data=dumps(dict(requests=requests,
+                                                 transaction=True)))
+        self.assertEqual(response.status_code, 400)
+        responses = loads(response.data)['responses']
+        self.assertEqual([r['status'] for r in responses], [200, 200, 400])
+        self.assertEqual(responses[1]['body']['age'], 24)
+        self.assertEqual(self.session.query(self.Person).get(1).age, 23)
+
+        del requests[2]['body']['bogus']
+        response = self.app.post('/api/batch',
+                                 data=dumps(dict(requests=requests,
+                                                 transaction=True)))
+        self.assertEqual(response.status_code, 200)
+        self.session.expire_all()
+        self.assertEqual(self.session.query(self.Person).get(1).age, 24)
+        self.assertEqual(self.session.query(self.Person).count(), 6)
+
+    def test_transaction_bulk_update(self):
+        """Tests that instances updated by a single ``UPDATE`` statement in a
+        transactional batch are not read from the session with their old
+        values by the later requests of the batch.
+
+        """
+        self.manager.create_api(self.Person, methods=['GET', 'PATCH'],
+                                allow_patch_many=True, url_prefix='/api/v2')
+        requests = [dict(path='/api/v2/person/1'),
+                    dict(method='PATCH', path='/api/v2/person',
+                         body=dict(age=99)),
+                    dict(path='/api/v2/person/1')]
+        response = self.app.post('/api/batch',
+                                 data=dumps(dict(requests=requests,
+                                                 transaction=True)))
+        self.assertEqual(response.status_code, 200)
+        responses = loads(response.data)['responses']
+        self.assertEqual(responses[0]['body']['age'], 23)
+        self.assertEqual(responses[1]['body']['num_modified'], 5)
+        self.assertEqual(responses[2]['body']['age'], 99)
+
+    def test_transaction_bulk_delete(self):
+        """Tests that instances deleted by a single ``DELETE`` statement in a
+        transactional batch are not read from the session by the later
+        requests of the batch.
+
+        """
+        self.manager.create_api(self.Star, methods=['GET', 'DELETE'],
+                                allow_delete_many=True)
+        # the session holds only weak references to its instances
+        stars = [self.Star(inception_time=datetime(2000 + i, 1, 1))
+                 for i in range(3)]
+        self.session.add_all(stars)
+        self.session.commit()
+        q = dumps(dict(filters=[dict(name='id', op='gt', val=1)]))
+        requests = [dict(path='/api/star/2'),
+                    dict(method='DELETE', path='/api/star?q=%s' % q),
+                    dict(path='/api/star/2')]
+        statements = self.record_statements()
+        response = self.app.post('/api/batch',
+                                 data=dumps(dict(requests=requests,
+                                                 transaction=True)))
+        self.assertEqual(response.status_code, 400)
+        responses = loads(response.data)['responses']
+        self.assertEqual([r['status'] for r in responses], [200, 200, 404])
+        self.assertEqual(responses[1]['body']['num_deleted'], 2)
+        self.assertEqual(len([statement for statement in statements
+                              if statement.startswith('DELETE')]), 1)
+
 def load_tests(loader, standard_tests, pattern):
     """Returns the test suite for this module."""
     suite = TestSuite()
@@ -1109,4 +2202,5 @@ def load_tests(loader, standard_tests, pattern):
     suite.addTest(loader.loadTestsFromTestCase(FunctionAPITestCase))
     suite.addTest(loader.loadTestsFromTestCase(FunctionEvaluationTest))
     suite.addTest(loader.loadTestsFromTestCase(APITestCase))
+    suite.addTest(loader.loadTestsFromTestCase(BatchAPITestCase))
     return suite